@@ -163,6 +163,23 @@ FROM leads l
 LEFT JOIN conversations c ON l.id = c.lead_id
 GROUP BY l.id, l.phone, l.name, l.status, l.created_at;
 
+-- ============ FUNCTIONS ============
+
+-- Direction/status counts over the newest p_limit messages (all when NULL),
+-- so stats endpoints get a few grouped rows instead of every message
+CREATE OR REPLACE FUNCTION messages_stats(p_phone text DEFAULT NULL, p_limit int DEFAULT NULL)
+RETURNS TABLE(direction text, status text, n bigint) AS $$
+    SELECT m.direction::text, m.status::text, count(*)
+    FROM (
+        SELECT direction, status
+        FROM messages
+        WHERE p_phone IS NULL OR phone = p_phone
+        ORDER BY created_at DESC
+        LIMIT p_limit
+    ) m
+    GROUP BY m.direction, m.status;
+$$ LANGUAGE sql STABLE;
+
 -- ============ ENABLE ROW-LEVEL SECURITY (RLS) ============
 -- Optional: Enable RLS for production use
 
@@ -191,6 +208,8 @@ GRANT SELECT ON conversation_stats_view TO anon;
 GRANT SELECT ON recent_messages_view TO anon;
 GRANT SELECT ON lead_activity_view TO anon;
 
+GRANT EXECUTE ON FUNCTION messages_stats(text, int) TO anon;
+
 -- ============ SUCCESS ============
 -- All tables, indexes, and views have been created!
 -- Your Supabase database is now ready for the Multi-Channel Communication API
@@ -5,7 +5,11 @@ WEBHOOK NOT WORKING? START HERE!
 This script will help you diagnose and fix webhook issues.
 """
 
-print("""
+import sys
+
+__all__ = ["BANNER", "main"]
+
+BANNER = """
 ╔════════════════════════════════════════════════════════════════════════════╗
 ║                 WEBHOOK SETUP QUICK START                                  ║
 ╚════════════════════════════════════════════════════════════════════════════╝
@@ -102,4 +106,13 @@ Logs: Check your terminal where python main.py is running
 5. All visible in /recent-messages endpoint
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+"""
+
+
+def main():
+    """Print the quick start banner"""
+    sys.stdout.write(BANNER + "\n")
+
+
+if __name__ == "__main__":
+    main()
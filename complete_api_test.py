@@ -4,46 +4,65 @@ Complete API Testing and Setup Script
 Tests all endpoints and provides detailed diagnostics
 """
 
-import requests
-import json
+import asyncio
+import httpx
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Callable
+
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = lambda o: orjson.dumps(o, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    import json
+    _loads = json.loads
+    _dumps = lambda o: json.dumps(o, indent=2)
 
 API_BASE = "http://localhost:10000"
 TEST_PHONE = "917974734809"
 TEST_PHONE_ALT = "919876543210"
+RETRY_STATUSES = (502, 503, 504)  # Render cold-start / gateway errors
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
 
 class APITester:
     def __init__(self, base_url=API_BASE):
         self.base_url = base_url
-        self.session = requests.Session()
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=10,
+            # Connection-level retries; 5xx retries happen in _request.
+            # Limits go on the transport: httpx ignores client limits= when a transport is passed
+            transport=httpx.AsyncHTTPTransport(
+                retries=RETRY_TOTAL,
+                limits=httpx.Limits(max_keepalive_connections=20)
+            )
+        )
         self.results = []
     
-    def test_endpoint(self, method: str, endpoint: str, payload=None, params=None) -> Dict[str, Any]:
-        """Test an API endpoint"""
-        url = f"{self.base_url}{endpoint}"
+    async def aclose(self):
+        await self.client.aclose()
+    
+    async def _request(self, method: str, endpoint: str, payload=None, params=None) -> Dict[str, Any]:
+        """Issue a request and wrap the outcome in a result dict"""
         try:
-            if method == "GET":
-                response = self.session.get(url, params=params, timeout=10)
-            elif method == "POST":
-                response = self.session.post(url, json=payload, timeout=10)
-            else:
-                response = self.session.request(method, url, json=payload, timeout=10)
+            for attempt in range(RETRY_TOTAL + 1):
+                response = await self.client.request(method, endpoint, json=payload, params=params)
+                if response.status_code not in RETRY_STATUSES or attempt == RETRY_TOTAL:
+                    break
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
             
-            result = {
+            return {
                 "endpoint": endpoint,
                 "method": method,
                 "status": response.status_code,
                 "success": response.status_code in [200, 201],
-                "response": response.json() if response.text else None,
+                "response": _loads(response.content) if response.content else None,
                 "error": None
             }
             
-            self.results.append(result)
-            return result
-            
         except Exception as e:
-            result = {
+            return {
                 "endpoint": endpoint,
                 "method": method,
                 "status": 0,
@@ -51,8 +70,27 @@ class APITester:
                 "response": None,
                 "error": str(e)
             }
-            self.results.append(result)
-            return result
+    
+    async def test_endpoint(self, method: str, endpoint: str, payload=None, params=None) -> Dict[str, Any]:
+        """Test an API endpoint"""
+        result = await self._request(method, endpoint, payload, params)
+        self.results.append(result)
+        return result
+    
+    async def poll_until(self, predicate: Callable[[], Any], timeout: float = 5.0, interval: float = 0.25) -> bool:
+        """Await predicate() until it is truthy or the timeout expires"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if await predicate():
+                return True
+            await asyncio.sleep(interval)
+        return False
+    
+    async def conversation_has(self, phone: str, text: str) -> bool:
+        """Check whether a message has landed in the stored conversation"""
+        result = await self._request("GET", "/get-conversation", params={"phone": phone})
+        messages = (result["response"] or {}).get("messages", []) if result["success"] else []
+        return any(m.get("message") == text for m in messages)
     
     def print_result(self, result: Dict[str, Any]):
         """Pretty print a test result"""
@@ -62,28 +100,23 @@ class APITester:
         if result['error']:
             print(f"  Error: {result['error']}")
         if result['response']:
-            print(f"  Response: {json.dumps(result['response'], indent=2)[:200]}...")
+            print(f"  Response: {_dumps(result['response'])[:200]}...")
 
-def main():
-    print("\n" + "="*60)
-    print("Multi-Channel Communication API - Complete Test Suite")
-    print("="*60)
-    
-    tester = APITester()
-    
-    # Test 1: Health Check
+async def run_tests(tester: APITester) -> bool:
+    # Tests 1 and 2 don't depend on any write - issue them together
+    health, status = await asyncio.gather(
+        tester.test_endpoint("GET", "/"),
+        tester.test_endpoint("GET", "/status")
+    )
     print("\n[TEST 1] Health Check")
-    result = tester.test_endpoint("GET", "/")
-    tester.print_result(result)
+    tester.print_result(health)
     
-    if not result["success"]:
+    if not health["success"]:
         print("\n✗ Server is not running. Start with: python main.py")
-        return
+        return False
     
-    # Test 2: Status
     print("\n[TEST 2] API Status")
-    result = tester.test_endpoint("GET", "/status")
-    tester.print_result(result)
+    tester.print_result(status)
     
     # Test 3: Receive Message (No WhatsApp API needed)
     print("\n[TEST 3] Receive Message - Inbound")
@@ -92,36 +125,31 @@ def main():
         "message_text": "Hello! This is a test message from the test suite",
         "name": "Test User"
     }
-    result = tester.test_endpoint("POST", "/receive-simple", payload)
-    tester.print_result(result)
-    
-    # Wait a moment for database writes
-    time.sleep(1)
-    
-    # Test 4: Get Conversation
-    print("\n[TEST 4] Get Conversation History")
-    result = tester.test_endpoint("GET", "/get-conversation", params={"phone": TEST_PHONE})
+    result = await tester.test_endpoint("POST", "/receive-simple", payload)
     tester.print_result(result)
     
-    # Test 5: Analytics - All
-    print("\n[TEST 5] Get Analytics - All Phones")
-    result = tester.test_endpoint("GET", "/analytics")
-    tester.print_result(result)
-    
-    # Test 6: Analytics - Specific Phone
-    print("\n[TEST 6] Get Analytics - Specific Phone")
-    result = tester.test_endpoint("GET", "/analytics", params={"phone": TEST_PHONE})
-    tester.print_result(result)
-    
-    # Test 7: Recent Messages
-    print("\n[TEST 7] Get Recent Messages")
-    result = tester.test_endpoint("GET", "/recent-messages")
-    tester.print_result(result)
-    
-    # Test 8: Leads List
-    print("\n[TEST 8] Get Leads")
-    result = tester.test_endpoint("GET", "/leads")
-    tester.print_result(result)
+    # Wait only as long as it takes for the database write to land
+    if result["success"]:
+        await tester.poll_until(lambda: tester.conversation_has(TEST_PHONE, payload["message_text"]))
+    
+    # Tests 4-8 should all see the stored message/lead but don't depend on each other
+    labels = [
+        "[TEST 4] Get Conversation History",
+        "[TEST 5] Get Analytics - All Phones",
+        "[TEST 6] Get Analytics - Specific Phone",
+        "[TEST 7] Get Recent Messages",
+        "[TEST 8] Get Leads"
+    ]
+    results = await asyncio.gather(
+        tester.test_endpoint("GET", "/get-conversation", params={"phone": TEST_PHONE}),
+        tester.test_endpoint("GET", "/analytics"),
+        tester.test_endpoint("GET", "/analytics", params={"phone": TEST_PHONE}),
+        tester.test_endpoint("GET", "/recent-messages"),
+        tester.test_endpoint("GET", "/leads")
+    )
+    for label, result in zip(labels, results):
+        print(f"\n{label}")
+        tester.print_result(result)
     
     # Test 9: Another receive message to test multiple messages
     print("\n[TEST 9] Receive Another Message")
@@ -130,16 +158,35 @@ def main():
         "message_text": "Second test message",
         "name": "Test User"
     }
-    result = tester.test_endpoint("POST", "/receive-simple", payload)
+    result = await tester.test_endpoint("POST", "/receive-simple", payload)
     tester.print_result(result)
     
-    time.sleep(1)
+    if result["success"]:
+        await tester.poll_until(lambda: tester.conversation_has(TEST_PHONE, payload["message_text"]))
     
     # Test 10: Analytics after multiple messages
     print("\n[TEST 10] Get Analytics After Multiple Messages")
-    result = tester.test_endpoint("GET", "/analytics", params={"phone": TEST_PHONE})
+    result = await tester.test_endpoint("GET", "/analytics", params={"phone": TEST_PHONE})
     tester.print_result(result)
     
+    return True
+
+def main():
+    print("\n" + "="*60)
+    print("Multi-Channel Communication API - Complete Test Suite")
+    print("="*60)
+    
+    tester = APITester()
+    
+    async def run():
+        try:
+            return await run_tests(tester)
+        finally:
+            await tester.aclose()
+    
+    if not asyncio.run(run()):
+        return
+    
     # Summary
     print("\n" + "="*60)
     print("TEST SUMMARY")
@@ -2,52 +2,158 @@
 Configuration and Environment Variables
 """
 
+import logging
 import os
-from dotenv import load_dotenv
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Optional
+from dotenv import dotenv_values
 
-# Load .env file explicitly
-env_path = Path(__file__).parent / ".env"
-load_dotenv(dotenv_path=env_path, override=True)
+ENV_PATH = Path(__file__).resolve().parent / ".env"
 
-print(f"🔍 Loading .env from: {env_path}")
-print(f"✓ .env exists: {env_path.exists()}")
+@lru_cache(maxsize=1)
+def _parse_env(mtime: float) -> Dict[str, Optional[str]]:
+    """Parse .env once per modification time"""
+    return dotenv_values(ENV_PATH)
 
-# ============ SUPABASE CONFIG ============
-SUPABASE_URL = os.getenv("SUPABASE_URL", "")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY", "")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", SUPABASE_KEY)
+def load_env() -> Dict[str, Optional[str]]:
+    """Get parsed .env values (re-read from disk only when the file changes)"""
+    try:
+        mtime = ENV_PATH.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+    return _parse_env(mtime)
 
-print(f"✓ SUPABASE_URL loaded: {'✅' if SUPABASE_URL else '❌'}")
-print(f"✓ SUPABASE_KEY loaded: {'✅' if SUPABASE_KEY else '❌'}")
+# .env fills in whatever the real environment doesn't set (see _env for precedence)
+ENV = load_env()
 
-# ============ WHATSAPP CONFIG ============
-ACCESS_TOKEN = os.getenv("ACCESS_TOKEN", "")
-PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID", "")
-WABA_ID = os.getenv("WABA_ID", "")
-VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "verify_token_123")
+def _env(name: str, default: str = "") -> str:
+    """Look up a setting: process environment first, then the .env file"""
+    return os.getenv(name) or ENV.get(name) or default
+
+# ============ SETTINGS ============
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Environment settings, read once per process and never mutated"""
+    # Supabase
+    SUPABASE_URL: str
+    SUPABASE_KEY: str
+    SUPABASE_SERVICE_KEY: str
+    DATABASE_URL: str
+    REDIS_URL: str
+    # WhatsApp
+    ACCESS_TOKEN: str
+    PHONE_NUMBER_ID: str
+    WABA_ID: str
+    VERIFY_TOKEN: str
+    APP_SECRET: str
+    # Gemini
+    GEMINI_API_KEY: str
+    # Deployment
+    RENDER_WEBHOOK_URL: str
+    PORT: int
+    HOST: str
+    # Webhook processing
+    MESSAGE_CONCURRENCY: int
+    # App
+    APP_VERSION: str = "4.0.0"
+    APP_TITLE: str = "Multi-Channel Communication API"
+    APP_DESCRIPTION: str = "WhatsApp Business API with Lead Management and AI Auto-Replies"
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        supabase_key = _env("SUPABASE_ANON_KEY")
+        return cls(
+            SUPABASE_URL=_env("SUPABASE_URL"),
+            SUPABASE_KEY=supabase_key,
+            SUPABASE_SERVICE_KEY=_env("SUPABASE_SERVICE_ROLE_KEY", supabase_key),
+            DATABASE_URL=_env("DATABASE_URL"),
+            REDIS_URL=_env("REDIS_URL"),
+            ACCESS_TOKEN=_env("ACCESS_TOKEN"),
+            PHONE_NUMBER_ID=_env("PHONE_NUMBER_ID"),
+            WABA_ID=_env("WABA_ID"),
+            VERIFY_TOKEN=_env("VERIFY_TOKEN", "verify_token_123"),
+            APP_SECRET=_env("APP_SECRET"),
+            GEMINI_API_KEY=_env("GEMINI_API_KEY"),
+            RENDER_WEBHOOK_URL=_env("WEBHOOK_URL", "https://receivemessage.onrender.com/webhook"),
+            PORT=int(_env("API_PORT") or _env("PORT") or 8000),
+            HOST=_env("API_HOST") or _env("HOST") or "0.0.0.0",
+            MESSAGE_CONCURRENCY=int(_env("MESSAGE_CONCURRENCY") or 5),
+        )
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """The process-wide Settings instance"""
+    return Settings.from_env()
+
+settings = get_settings()
 
-print(f"✓ ACCESS_TOKEN loaded: {'✅' if ACCESS_TOKEN else '❌'}")
-print(f"✓ PHONE_NUMBER_ID loaded: {'✅' if PHONE_NUMBER_ID else '❌'}")
-print(f"✓ WABA_ID loaded: {'✅' if WABA_ID else '❌'}")
+# ============ SUPABASE CONFIG ============
+# Module-level names kept for existing `from config import X` imports
+SUPABASE_URL = settings.SUPABASE_URL
+SUPABASE_KEY = settings.SUPABASE_KEY
+SUPABASE_SERVICE_KEY = settings.SUPABASE_SERVICE_KEY
+# Optional direct Postgres DSN (Supavisor pooler); enables the asyncpg write path
+DATABASE_URL = settings.DATABASE_URL
+# Optional Redis for state shared across workers (webhook dedup)
+REDIS_URL = settings.REDIS_URL
+
+# ============ WHATSAPP CONFIG ============
+ACCESS_TOKEN = settings.ACCESS_TOKEN
+PHONE_NUMBER_ID = settings.PHONE_NUMBER_ID
+WABA_ID = settings.WABA_ID
+VERIFY_TOKEN = settings.VERIFY_TOKEN
+APP_SECRET = settings.APP_SECRET  # Meta app secret; signs X-Hub-Signature-256
 
 # ============ GEMINI CONFIG ============
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+GEMINI_API_KEY = settings.GEMINI_API_KEY
 GEMINI_READY = False  # Will be set to True after successful initialization in startup event
 
-# Dictionary to track service readiness (mutable global state)
+# Runtime readiness flags - mutated by the app, so deliberately not part of Settings
 SERVICE_STATUS = {
     "gemini": False,
     "whatsapp": bool(ACCESS_TOKEN and PHONE_NUMBER_ID and WABA_ID),
-    "database": bool(os.getenv("SUPABASE_URL", ""))
+    "database": bool(SUPABASE_URL)
 }
 
 # ============ DEPLOYMENT CONFIG ============
-RENDER_WEBHOOK_URL = os.getenv("WEBHOOK_URL", "https://receivemessage.onrender.com/webhook")
-PORT = int(os.getenv("API_PORT") or os.getenv("PORT") or 8000)
-HOST = os.getenv("API_HOST") or os.getenv("HOST") or "0.0.0.0"
+RENDER_WEBHOOK_URL = settings.RENDER_WEBHOOK_URL
+PORT = settings.PORT
+HOST = settings.HOST
+
+# ============ WEBHOOK CONFIG ============
+# Max webhook messages/statuses processed at once (each may wait on Gemini + Graph API)
+MESSAGE_CONCURRENCY = settings.MESSAGE_CONCURRENCY
 
 # ============ APP CONFIG ============
-APP_VERSION = "4.0.0"
-APP_TITLE = "Multi-Channel Communication API"
-APP_DESCRIPTION = "WhatsApp Business API with Lead Management and AI Auto-Replies"
+APP_VERSION = settings.APP_VERSION
+APP_TITLE = settings.APP_TITLE
+APP_DESCRIPTION = settings.APP_DESCRIPTION
+
+# ============ DIAGNOSTIC LOGGING ============
+@lru_cache(maxsize=1)
+def get_diag_logger() -> logging.Logger:
+    """Logger for the setup/debug scripts (level from DIAG_LEVEL, e.g. WARNING in CI)"""
+    log = logging.getLogger("diag")
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(os.getenv("DIAG_LEVEL", "INFO").upper())
+    log.propagate = False
+    return log
+
+# Startup diagnostics are opt-in so plain imports stay quiet
+if os.getenv("CONFIG_DEBUG"):
+    _log = get_diag_logger()
+    _log.info("🔍 Loading .env from: %s", ENV_PATH)
+    _log.info("✓ .env exists: %s", ENV_PATH.exists())
+    for _name, _value in (
+        ("SUPABASE_URL", SUPABASE_URL),
+        ("SUPABASE_KEY", SUPABASE_KEY),
+        ("ACCESS_TOKEN", ACCESS_TOKEN),
+        ("PHONE_NUMBER_ID", PHONE_NUMBER_ID),
+        ("WABA_ID", WABA_ID),
+    ):
+        _log.info("✓ %s loaded: %s", _name, "✅" if _value else "❌")
@@ -11,9 +11,11 @@ Features:
 
 import json
 import logging
+import re
+import threading
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from google import genai
 from config import GEMINI_API_KEY, SUPABASE_URL, SUPABASE_SERVICE_KEY
 import requests
@@ -53,6 +55,12 @@ Remember: All Katyayani products are:
 ✓ Tested for Quality
 ✓ Certified Organic"""
 
+# First-turn replies are cached by normalized text ("Hi!!" == "hi"), skipping
+# anything that depends on the customer or on live pricing/stock
+REPLY_CACHE_SIZE = 256
+NO_CACHE_WORDS = {"price", "cost", "order", "account", "payment", "refund", "stock", "my"}
+_NON_WORD = re.compile(r"[^\w\s]+")
+
 
 class ContinuousChatHandler:
     def __init__(self):
@@ -60,6 +68,11 @@ class ContinuousChatHandler:
         self.client = client
         self.conv_history = defaultdict(list)
         self.products_cache = []
+        self.reply_cache: "OrderedDict[str, Tuple[str, List[Dict]]]" = OrderedDict()
+        self.reply_cache_hits = 0
+        self.reply_cache_misses = 0
+        # generate_response runs in worker threads (asyncio.to_thread); guards cache + counters
+        self.reply_cache_lock = threading.Lock()
         self.load_products()
     
     def load_products(self):
@@ -69,6 +82,8 @@ class ContinuousChatHandler:
             client = supabase.create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
             response = client.table('products').select('*').execute()
             self.products_cache = response.data if hasattr(response, 'data') else []
+            with self.reply_cache_lock:
+                self.reply_cache.clear()  # cached replies may mention old products
             logger.info(f"Loaded {len(self.products_cache)} products from database")
         except Exception as e:
             logger.error(f"Error loading products: {str(e)}")
@@ -131,7 +146,11 @@ class ContinuousChatHandler:
         return context
     
     def build_full_prompt(self, user_message: str, user_id: str) -> Tuple[str, List[Dict]]:
-        """Build complete prompt with context and product info"""
+        """Build the per-turn prompt with context and product info
+        
+        SYSTEM_PROMPT is not included here: it is sent as the system instruction so
+        every request shares the same prefix, which Gemini can serve from its implicit cache.
+        """
         
         # Get conversation context
         conv_context = self.get_conversation_context(user_id)
@@ -141,9 +160,7 @@ class ContinuousChatHandler:
         products_context = self.format_products_context(relevant_products)
         
         # Build full prompt
-        full_prompt = f"""{SYSTEM_PROMPT}
-
-{products_context}
+        full_prompt = f"""{products_context}
 
 Previous Conversation:
 {conv_context if conv_context else "(No previous messages)"}
@@ -154,11 +171,54 @@ Provide a helpful, conversational response."""
         
         return full_prompt, relevant_products
     
+    def reply_cache_key(self, user_message: str, user_id: str) -> Optional[str]:
+        """Cache key for a context-free message, or None if it must go to Gemini"""
+        if self.conv_history.get(user_id):
+            return None
+        key = " ".join(_NON_WORD.sub(" ", user_message.lower()).split())
+        if not key or NO_CACHE_WORDS.intersection(key.split()):
+            return None
+        return key
+    
+    def get_cached_reply(self, cache_key: str) -> Optional[Tuple[str, List[Dict]]]:
+        """Look up a cached reply and mark it most recently used (thread-safe)"""
+        with self.reply_cache_lock:
+            cached = self.reply_cache.get(cache_key)
+            if cached:
+                self.reply_cache.move_to_end(cache_key)
+                self.reply_cache_hits += 1
+            return cached
+    
+    def cache_reply(self, cache_key: str, ai_response: str, relevant_products: List[Dict]):
+        """Record a cache miss and store the reply, evicting the oldest entry (thread-safe)"""
+        with self.reply_cache_lock:
+            self.reply_cache_misses += 1
+            if ai_response:
+                self.reply_cache[cache_key] = (ai_response, relevant_products)
+                if len(self.reply_cache) > REPLY_CACHE_SIZE:
+                    self.reply_cache.popitem(last=False)
+    
     def generate_response(self, user_message: str, user_id: str, 
                          max_tokens: int = 500) -> Dict[str, Any]:
         """Generate AI response using Gemini with continuous context"""
         
         try:
+            cache_key = self.reply_cache_key(user_message, user_id)
+            cached = self.get_cached_reply(cache_key) if cache_key else None
+            if cached:
+                ai_response, relevant_products = cached
+                now = datetime.now().isoformat()
+                self.store_message(user_id, 'user', user_message, now)
+                self.store_message(user_id, 'assistant', ai_response, now)
+                return {
+                    'status': 'success',
+                    'response': ai_response,
+                    'relevant_products': relevant_products,
+                    'user_id': user_id,
+                    'cached': True,
+                    'timestamp': now
+                }
+            
             # Build prompt with context
             full_prompt, relevant_products = self.build_full_prompt(user_message, user_id)
             
@@ -167,6 +227,7 @@ Provide a helpful, conversational response."""
                 model=self.model_name,
                 contents=full_prompt,
                 config={
+                    'system_instruction': SYSTEM_PROMPT,
                     'max_output_tokens': max_tokens,
                     'temperature': 0.7,
                 }
@@ -174,16 +235,20 @@ Provide a helpful, conversational response."""
             
             ai_response = response.text
             
+            if cache_key:
+                self.cache_reply(cache_key, ai_response, relevant_products)
+            
             # Store in conversation history
-            self.store_message(user_id, 'user', user_message)
-            self.store_message(user_id, 'assistant', ai_response)
+            now = datetime.now().isoformat()
+            self.store_message(user_id, 'user', user_message, now)
+            self.store_message(user_id, 'assistant', ai_response, now)
             
             return {
                 'status': 'success',
                 'response': ai_response,
                 'relevant_products': relevant_products,
                 'user_id': user_id,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': now
             }
             
         except Exception as e:
@@ -194,12 +259,12 @@ Provide a helpful, conversational response."""
                 'response': "I encountered an error processing your request. Please try again."
             }
     
-    def store_message(self, user_id: str, role: str, content: str):
-        """Store message in conversation history"""
+    def store_message(self, user_id: str, role: str, content: str, timestamp: Optional[str] = None):
+        """Store message in conversation history (pass timestamp to reuse one per reply)"""
         self.conv_history[user_id].append({
             'role': role,
             'content': content,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp or datetime.now().isoformat()
         })
         
         # Keep conversation history to last 50 messages per user
@@ -248,13 +313,14 @@ Provide a helpful, conversational response."""
         # Check if it's a FAQ
         faq_answer = self.answer_faq(user_message)
         if faq_answer:
-            self.store_message(user_id, 'user', user_message)
-            self.store_message(user_id, 'assistant', faq_answer)
+            now = datetime.now().isoformat()
+            self.store_message(user_id, 'user', user_message, now)
+            self.store_message(user_id, 'assistant', faq_answer, now)
             return {
                 'status': 'success',
                 'response': faq_answer,
                 'type': 'faq',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': now
             }
         
         # Otherwise, generate AI response
@@ -2,8 +2,31 @@
 Quick diagnostic script - Run this to check all systems
 """
 
-import subprocess
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+import re
+from importlib.metadata import distributions
+
+# Third-party imports may be missing - that's what this script diagnoses
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    from config import SUPABASE_URL, SUPABASE_KEY, load_env
+    IMPORT_ERROR = None
+except ImportError as e:
+    requests = None
+    IMPORT_ERROR = e
+
+# One keep-alive session for all table probes
+if requests is not None:
+    _SESSION = requests.Session()
+    _SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=2)))
+    _SESSION.headers.update({
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+    })
 
 def check_python():
     print("✓ Python version:", sys.version.split()[0])
@@ -12,13 +35,19 @@ def check_dependencies():
     """Check if all required packages are installed"""
     print("\nChecking dependencies...")
     
-    required = ['fastapi', 'uvicorn', 'requests', 'pydantic', 'python-dotenv', 'google.generativeai']
+    required = ['fastapi', 'uvicorn', 'requests', 'pydantic', 'python-dotenv', 'google-generativeai']
+    
+    # One pass over installed dist-info metadata covers every package
+    installed = {
+        re.sub(r"[-_.]+", "-", dist.metadata["Name"]).lower(): dist.version
+        for dist in distributions()
+        if dist.metadata["Name"]
+    }
     
     for package in required:
-        try:
-            __import__(package.replace('.', '_') if package == 'google.generativeai' else package)
-            print(f"  ✓ {package}")
-        except ImportError:
+        if package in installed:
+            print(f"  ✓ {package} {installed[package]}")
+        else:
             print(f"  ✗ {package} - MISSING (install with: pip install {package})")
 
 def check_env():
@@ -26,9 +55,9 @@ def check_env():
     print("\nChecking environment variables...")
     
     try:
-        from dotenv import load_dotenv
-        import os
-        load_dotenv()
+        if IMPORT_ERROR:
+            raise IMPORT_ERROR
+        env = load_env()
         
         required_vars = {
             'SUPABASE_URL': 'Supabase project URL',
@@ -39,7 +68,7 @@ def check_env():
         }
         
         for var, description in required_vars.items():
-            value = os.getenv(var)
+            value = os.getenv(var) or env.get(var)
             if value:
                 # Show first 10 chars for security
                 display = value[:10] + '...' if len(value) > 10 else value
@@ -55,34 +84,33 @@ def check_database():
     print("\nChecking Supabase database...")
     
     try:
-        from config import SUPABASE_URL, SUPABASE_KEY
-        import requests
+        if IMPORT_ERROR:
+            raise IMPORT_ERROR
         
         if not SUPABASE_URL or not SUPABASE_KEY:
             print("  ✗ Supabase credentials not configured")
             return
         
-        headers = {
-            "apikey": SUPABASE_KEY,
-            "Authorization": f"Bearer {SUPABASE_KEY}",
-        }
-        
         required_tables = ['leads', 'conversations', 'messages']
         
-        for table in required_tables:
+        def probe(table):
             try:
-                response = requests.get(
-                    f"{SUPABASE_URL}/rest/v1/{table}?limit=0",
-                    headers=headers,
+                response = _SESSION.head(
+                    f"{SUPABASE_URL}/rest/v1/{table}",
+                    headers={"Range-Unit": "items", "Range": "0-0"},
                     timeout=5
                 )
                 
-                if response.status_code == 200:
-                    print(f"  ✓ Table '{table}' exists")
-                else:
-                    print(f"  ✗ Table '{table}' - Error {response.status_code}")
+                if response.status_code in (200, 206):
+                    return f"  ✓ Table '{table}' exists"
+                return f"  ✗ Table '{table}' - Error {response.status_code}"
             except Exception as e:
-                print(f"  ✗ Table '{table}' - {str(e)}")
+                return f"  ✗ Table '{table}' - {str(e)}"
+        
+        # Run the probes concurrently, report in table order
+        with ThreadPoolExecutor(max_workers=len(required_tables)) as executor:
+            for line in executor.map(probe, required_tables):
+                print(line)
     
     except Exception as e:
         print(f"  ✗ Database check failed: {e}")
@@ -3,144 +3,31 @@
 Direct Database Setup using Supabase Python Client
 """
 
-import os
+import importlib
+import importlib.util
+import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+import requests
+from requests.adapters import HTTPAdapter
+from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
+from db_setup_helper import check_table_exists
 
-def install_supabase_client():
-    """Install supabase client if not available"""
-    try:
-        import supabase
-        return True
-    except ImportError:
-        print("📦 Installing Supabase Python client...")
-        os.system("pip install supabase")
-        try:
-            import supabase
-            print("✅ Supabase client installed successfully")
-            return True
-        except ImportError:
-            print("❌ Failed to install Supabase client")
-            return False
+# Pooled REST session shared by every probe in this script
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+SESSION.headers.update({
+    "apikey": SUPABASE_SERVICE_KEY,
+    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
+    "Content-Type": "application/json"
+})
 
-def direct_sql_execution():
-    """Execute SQL commands directly using Supabase client"""
-    try:
-        if not install_supabase_client():
-            return False
-            
-        from supabase import create_client
-        from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
-        
-        if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-            print("❌ Supabase configuration missing")
-            return False
-        
-        print("🔗 Connecting to Supabase with service key...")
-        client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-        
-        # SQL commands to execute
-        sql_commands = [
-            """
-            CREATE TABLE IF NOT EXISTS admins (
-                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                email VARCHAR(255) NOT NULL UNIQUE,
-                name VARCHAR(255) NOT NULL,
-                phone VARCHAR(20),
-                password_hash VARCHAR(500),
-                role VARCHAR(50) DEFAULT 'admin',
-                status VARCHAR(50) DEFAULT 'active',
-                permissions JSONB DEFAULT '{"all": true}',
-                last_login TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS agents (
-                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                email VARCHAR(255) NOT NULL UNIQUE,
-                name VARCHAR(255) NOT NULL,
-                phone VARCHAR(20),
-                password_hash VARCHAR(500),
-                role VARCHAR(50) DEFAULT 'agent',
-                status VARCHAR(50) DEFAULT 'active',
-                assigned_leads_limit INT DEFAULT 50,
-                current_leads_count INT DEFAULT 0,
-                is_available BOOLEAN DEFAULT true,
-                last_activity TIMESTAMP,
-                performance_rating DECIMAL(3,2) DEFAULT 0.00,
-                total_leads_handled INT DEFAULT 0,
-                total_conversations INT DEFAULT 0,
-                created_by UUID,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS message_templates (
-                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                name VARCHAR(255) NOT NULL UNIQUE,
-                title VARCHAR(255),
-                content TEXT NOT NULL,
-                variables JSONB DEFAULT '[]',
-                category VARCHAR(100),
-                language VARCHAR(10) DEFAULT 'en',
-                is_active BOOLEAN DEFAULT true,
-                created_by_agent_id UUID,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            "CREATE INDEX IF NOT EXISTS idx_admins_email ON admins(email);",
-            "CREATE INDEX IF NOT EXISTS idx_agents_email ON agents(email);",
-            "CREATE INDEX IF NOT EXISTS idx_agents_status ON agents(status);",
-            "ALTER TABLE admins ENABLE ROW LEVEL SECURITY;",
-            "ALTER TABLE agents ENABLE ROW LEVEL SECURITY;",
-            "ALTER TABLE message_templates ENABLE ROW LEVEL SECURITY;",
-            "DROP POLICY IF EXISTS \"Enable all for admins\" ON admins;",
-            "CREATE POLICY \"Enable all for admins\" ON admins FOR ALL USING (true);",
-            "DROP POLICY IF EXISTS \"Enable all for agents\" ON agents;",
-            "CREATE POLICY \"Enable all for agents\" ON agents FOR ALL USING (true);",
-            "DROP POLICY IF EXISTS \"Enable all for templates\" ON message_templates;",
-            "CREATE POLICY \"Enable all for templates\" ON message_templates FOR ALL USING (true);"
-        ]
-        
-        # Execute each command
-        print("🚀 Executing SQL commands...")
-        for i, sql in enumerate(sql_commands, 1):
-            try:
-                print(f"📝 Executing command {i}/{len(sql_commands)}...")
-                
-                # Try using rpc method
-                result = client.rpc('exec_sql', {'query': sql.strip()}).execute()
-                print(f"   ✅ Command {i} executed successfully")
-                
-            except Exception as e:
-                print(f"   ⚠️  Command {i} failed: {e}")
-                # For CREATE TABLE commands, this might be expected if using client
-                if "CREATE TABLE" in sql:
-                    print(f"   📝 Attempting alternative method for table creation...")
-        
-        print("\n✅ SQL execution completed!")
-        return True
-        
-    except Exception as e:
-        print(f"❌ SQL execution failed: {e}")
-        return False
-
-def alternative_curl_method():
-    """Use curl commands to execute SQL via Supabase API"""
-    from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
-    
-    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-        print("❌ Supabase configuration missing")
-        return False
-    
-    print("🔄 Trying alternative curl method...")
-    
-    # Create the full SQL script in one command
-    full_sql = """
+# DDL runs in three phases: tables, then security, then indexes last
+# so a re-run against populated tables doesn't maintain indexes mid-setup
+TABLE_DDL = [
+    """
     CREATE TABLE IF NOT EXISTS admins (
         id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
         email VARCHAR(255) NOT NULL UNIQUE,
@@ -154,7 +41,8 @@ def alternative_curl_method():
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
-    
+    """,
+    """
     CREATE TABLE IF NOT EXISTS agents (
         id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
         email VARCHAR(255) NOT NULL UNIQUE,
@@ -174,7 +62,8 @@ def alternative_curl_method():
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
-    
+    """,
+    """
     CREATE TABLE IF NOT EXISTS message_templates (
         id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
         name VARCHAR(255) NOT NULL UNIQUE,
@@ -188,33 +77,151 @@ def alternative_curl_method():
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
-    
-    ALTER TABLE admins ENABLE ROW LEVEL SECURITY;
-    ALTER TABLE agents ENABLE ROW LEVEL SECURITY;
-    ALTER TABLE message_templates ENABLE ROW LEVEL SECURITY;
-    
-    DROP POLICY IF EXISTS "Enable all for admins" ON admins;
-    CREATE POLICY "Enable all for admins" ON admins FOR ALL USING (true);
-    DROP POLICY IF EXISTS "Enable all for agents" ON agents;
-    CREATE POLICY "Enable all for agents" ON agents FOR ALL USING (true);
-    DROP POLICY IF EXISTS "Enable all for templates" ON message_templates;
-    CREATE POLICY "Enable all for templates" ON message_templates FOR ALL USING (true);
-    
-    SELECT 'Database setup completed successfully!' as result;
     """
+]
+
+SECURITY_DDL = [
+    "ALTER TABLE admins ENABLE ROW LEVEL SECURITY;",
+    "ALTER TABLE agents ENABLE ROW LEVEL SECURITY;",
+    "ALTER TABLE message_templates ENABLE ROW LEVEL SECURITY;"
+] + [
+    # Only create a policy when pg_policies doesn't already have it
+    f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_policies
+            WHERE schemaname = 'public' AND tablename = '{table}' AND policyname = '{policy}'
+        ) THEN
+            CREATE POLICY "{policy}" ON {table} FOR ALL USING (true);
+        END IF;
+    END $$;
+    """
+    for table, policy in (
+        ("admins", "Enable all for admins"),
+        ("agents", "Enable all for agents"),
+        ("message_templates", "Enable all for templates")
+    )
+]
+
+# Not CONCURRENTLY: exec_sql runs inside a function (a transaction),
+# where Postgres rejects CREATE INDEX CONCURRENTLY
+INDEX_DDL = [
+    "CREATE INDEX IF NOT EXISTS idx_admins_email ON admins(email);",
+    "CREATE INDEX IF NOT EXISTS idx_agents_email ON agents(email);",
+    "CREATE INDEX IF NOT EXISTS idx_agents_status ON agents(status);"
+]
+
+# Statements are stripped once here; callers send them as-is
+PHASES = tuple(
+    (phase, tuple(sql.strip() for sql in commands))
+    for phase, commands in (
+        ("tables", TABLE_DDL),
+        ("security", SECURITY_DDL),
+        ("indexes", INDEX_DDL)
+    )
+)
+SQL_COMMANDS = tuple(sql for _, commands in PHASES for sql in commands)
+
+# Whole script for a single exec_sql round trip
+BATCHED_SQL = "\n".join(SQL_COMMANDS)
+
+
+_SUPABASE_AVAILABLE = False
+
+def install_supabase_client():
+    """Install supabase client if not available"""
+    global _SUPABASE_AVAILABLE
+    if _SUPABASE_AVAILABLE:
+        return True
     
-    # Write SQL to temporary file
-    with open('temp_setup.sql', 'w') as f:
-        f.write(full_sql)
+    # find_spec only looks the package up; pip runs only when it's missing
+    if importlib.util.find_spec("supabase") is None:
+        print("📦 Installing Supabase Python client...")
+        subprocess.run(
+            [sys.executable, "-m", "pip", "install", "--quiet",
+             "--disable-pip-version-check", "--no-input", "supabase"],
+            check=False
+        )
+        importlib.invalidate_caches()
+        if importlib.util.find_spec("supabase") is None:
+            print("❌ Failed to install Supabase client")
+            return False
+        print("✅ Supabase client installed successfully")
     
-    # Use curl to execute via Supabase API (if they have an RPC endpoint)
-    curl_command = f'''curl -X POST "{SUPABASE_URL}/rest/v1/rpc/exec_sql" \\
--H "apikey: {SUPABASE_SERVICE_KEY}" \\
--H "Authorization: Bearer {SUPABASE_SERVICE_KEY}" \\
--H "Content-Type: application/json" \\
--d '{{"sql": "{full_sql.replace(chr(10), ' ').replace(chr(13), ' ').replace('"', '\\"')}"}}' '''
+    _SUPABASE_AVAILABLE = True
+    return True
+
+@lru_cache(maxsize=1)
+def get_client():
+    """Create the Supabase client once per process"""
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+def direct_sql_execution():
+    """Execute SQL commands directly using Supabase client"""
+    try:
+        if not install_supabase_client():
+            return False
+            
+        if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+            print("❌ Supabase configuration missing")
+            return False
+        
+        print("🔗 Connecting to Supabase with service key...")
+        client = get_client()
+        
+        # One round trip for the whole script
+        print("🚀 Executing SQL commands...")
+        try:
+            client.rpc('exec_sql', {'query': BATCHED_SQL}).execute()
+            print("   ✅ All commands executed in one batch")
+        except Exception as e:
+            # Every statement is idempotent, so re-running them one by one
+            # pinpoints which one fails
+            print(f"   ⚠️  Batched execution failed: {e}")
+            print("   🔁 Falling back to per-statement execution...")
+            for phase, sql_commands in PHASES:
+                print(f"\n📂 Phase: {phase}")
+                for i, sql in enumerate(sql_commands, 1):
+                    try:
+                        print(f"📝 Executing command {i}/{len(sql_commands)}...")
+                        
+                        # Try using rpc method
+                        result = client.rpc('exec_sql', {'query': sql}).execute()
+                        print(f"   ✅ Command {i} executed successfully")
+                        
+                    except Exception as e:
+                        print(f"   ⚠️  Command {i} failed: {e}")
+                        # For CREATE TABLE commands, this might be expected if using client
+                        if "CREATE TABLE" in sql:
+                            print(f"   📝 Attempting alternative method for table creation...")
+        
+        print("\n✅ SQL execution completed!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ SQL execution failed: {e}")
+        return False
+
+def alternative_rest_method():
+    """Send the batched SQL to the exec_sql RPC over plain REST (no supabase client)"""
+    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+        print("❌ Supabase configuration missing")
+        return False
     
-    print("📝 Curl command prepared, but Supabase doesn't allow direct SQL execution via REST API")
+    print("🔄 Trying direct REST call to exec_sql...")
+    try:
+        response = SESSION.post(
+            f"{SUPABASE_URL}/rest/v1/rpc/exec_sql",
+            json={"query": BATCHED_SQL},
+            timeout=30
+        )
+        if response.status_code in (200, 204):
+            return True
+        print(f"   ⚠️  exec_sql failed: {response.status_code} - {response.text[:200]}")
+    except Exception as e:
+        print(f"   ⚠️  REST call failed: {e}")
     return False
 
 def main():
@@ -226,9 +233,9 @@ def main():
     if direct_sql_execution():
         print("\n✅ Setup completed via Supabase client!")
     else:
-        # Try method 2: Alternative curl
-        if alternative_curl_method():
-            print("\n✅ Setup completed via curl!")
+        # Try method 2: Plain REST call
+        if alternative_rest_method():
+            print("\n✅ Setup completed via REST!")
         else:
             print("\n❌ Terminal setup methods failed")
             print("\n🔄 ALTERNATIVE SOLUTION:")
@@ -252,7 +259,11 @@ def main():
     
     # Always run verification at the end
     print("\n📊 Running verification...")
-    os.system("python db_setup_helper.py")
+    try:
+        from db_setup_helper import main as verify_main
+        verify_main()
+    except Exception as e:
+        print(f"⚠️  Verification failed: {e}")
 
 def create_tables_manually():
     """Create tables using schema detection and manual REST calls"""
@@ -263,36 +274,23 @@ def create_tables_manually():
         # But since Supabase REST API doesn't allow direct table creation,
         # we'll just verify tables exist and suggest the dashboard approach
         
-        import requests
-        from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
-        
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         # Test each table
         tables_to_check = ["admins", "agents", "message_templates"]
         
-        for table in tables_to_check:
-            try:
-                response = requests.get(
-                    f"{SUPABASE_URL}/rest/v1/{table}?limit=1",
-                    headers=headers,
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    print(f"   ✅ {table} table exists")
-                else:
-                    print(f"   ❌ {table} table missing (cannot create via REST)")
-                    return False
-            except Exception as e:
-                print(f"   ❌ Error checking {table}: {e}")
-                return False
+        def probe(table):
+            # Same HEAD + empty Range probe as db_setup_helper/diagnose
+            if check_table_exists(table):
+                return True, f"   ✅ {table} table exists"
+            return False, f"   ❌ {table} table missing (cannot create via REST)"
         
-        return True
+        # All probes run at once; report in table order
+        with ThreadPoolExecutor(max_workers=len(tables_to_check)) as executor:
+            results = list(executor.map(probe, tables_to_check))
+        
+        for _, line in results:
+            print(line)
+        
+        return all(ok for ok, _ in results)
         
     except Exception as e:
         print(f"❌ Manual creation failed: {e}")
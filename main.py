@@ -9,37 +9,51 @@ Modular structure:
 - main.py: FastAPI app and endpoints
 """
 
-from fastapi import FastAPI, Request, HTTPException, Query, Header, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse
+from fastapi import FastAPI, Request, HTTPException, Query, Header, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from pydantic import ValidationError
+from collections import Counter
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import asyncio
 import logging
-import requests
-import json
-import uuid
+import queue
+import httpx
+import re
+from logging.handlers import QueueHandler, QueueListener
+import secrets
 import hmac
-import hashlib
 from typing import Optional, List, Dict, Any
+import orjson
+
+try:
+    import yaml
+    _YAML_OK = True
+except ImportError:  # only needed for /swagger.yaml
+    yaml = None
+    _YAML_OK = False
 
 # Import from modular files
 from config import (
     SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_KEY,
-    ACCESS_TOKEN, PHONE_NUMBER_ID, WABA_ID, VERIFY_TOKEN,
+    ACCESS_TOKEN, PHONE_NUMBER_ID, WABA_ID, VERIFY_TOKEN, APP_SECRET,
     GEMINI_API_KEY, GEMINI_READY, PORT, HOST, APP_TITLE, APP_DESCRIPTION, APP_VERSION,
-    SERVICE_STATUS
+    SERVICE_STATUS, MESSAGE_CONCURRENCY
 )
 import models
 import utils
 from models import (
     MessageCreate, ReceiveMessage, TemplateCreate, TemplateSend,
-    LeadCreate, LeadUpdate, ConversationResponse, RecentMessagesResponse, WebhookMessage,
+    LeadCreate, LeadUpdate, ConversationResponse, RecentMessagesResponse, WebhookMessage, WebhookPayload,
     MediaMessageCreate, MessageResponse, ReceiveMessageResponse, MessageStatusUpdate,
     MessageStatusResponse, SentimentResponse, AnalyticsResponse, LeadResponse,
     LeadListResponse, TemplateResponse, TemplateListResponse, ApiResponse, ErrorResponse,
     MessageTypeEnum, MessageStatusEnum, SentimentEnum, TemplateModeEnum
 )
 from utils import (
-    get_supabase_headers, log_api_call, add_to_recent_messages, get_recent_messages,
+    log_api_call, add_to_recent_messages, get_recent_messages,
     store_lead, store_conversation, store_message, store_conversation_with_message, update_message_status,
     generate_ai_reply, send_whatsapp_message, verify_webhook_token,
     send_media_message, send_template_message, create_whatsapp_template, update_message_status_advanced, analyze_sentiment,
@@ -47,10 +61,16 @@ from utils import (
 )
 
 # Setup logging (MUST be before using logger)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Handlers only enqueue records; a listener thread does the actual stream writes
+# so request handlers never block on stdout/stderr
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_enqueue = QueueHandler(_log_queue)
+_log_enqueue.setFormatter(logging.Formatter('%(message)s'))
+log_listener = QueueListener(_log_queue, _log_stream)
+logging.basicConfig(level=logging.INFO, handlers=[_log_enqueue])
+log_listener.start()
 logger = logging.getLogger(__name__)
 
 # Import continuous chat for Gemini AI integration
@@ -62,159 +82,222 @@ except Exception as e:
     logger.warning(f"⚠️ Continuous Chat not available: {e}")
     CONTINUOUS_CHAT_ENABLED = False
 
-# Initialize FastAPI app
-app = FastAPI(
-    title=APP_TITLE,
-    version=APP_VERSION,
-    description=APP_DESCRIPTION
-)
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # ============ STARTUP & SHUTDOWN EVENTS ============
 
-@app.on_event("startup")
 async def startup_event():
     """Initialize services on app startup"""
-    logger.info("🚀 Application Starting Up...")
+    logger.info("=" * 70)
+    logger.info(f"  {APP_TITLE} v{APP_VERSION}")
+    logger.info("=" * 70)
+    logger.info("")
+    logger.info("🔧 Initializing Services:")
+    
+    # Initialize Gemini
+    if GEMINI_API_KEY:
+        try:
+            if utils.get_gemini_model() is None:
+                raise ImportError("google.generativeai not installed")
+            SERVICE_STATUS["gemini"] = True
+            logger.info("   ✓ Gemini AI: Ready (gemini-2.5-pro)")
+        except Exception as e:
+            logger.error(f"   ✗ Gemini AI: Failed to initialize - {e}")
+            SERVICE_STATUS["gemini"] = False
+    else:
+        logger.warning("   ⚠ Gemini AI: No API key provided - auto-replies disabled")
+        SERVICE_STATUS["gemini"] = False
     
     # Load products for continuous chat
     if CONTINUOUS_CHAT_ENABLED:
         try:
             reload_products()
-            logger.info("✅ Products loaded for Continuous Chat")
+            logger.info("   ✓ Products loaded for Continuous Chat")
         except Exception as e:
             logger.error(f"Error loading products: {e}")
     
+    # Log other services
+    logger.info(f"   {'✓' if CONTINUOUS_CHAT_ENABLED else '⚠'} Continuous Chat: {'Enabled' if CONTINUOUS_CHAT_ENABLED else 'Disabled'}")
+    logger.info(f"   {'✓' if ACCESS_TOKEN and PHONE_NUMBER_ID else '⚠'} WhatsApp: {'Configured' if ACCESS_TOKEN and PHONE_NUMBER_ID else 'Not Configured'}")
+    logger.info(f"   {'✓' if SUPABASE_URL else '⚠'} Database: {'Connected' if SUPABASE_URL else 'Not Configured'}")
+    logger.info("")
+    logger.info(" API Documentation:")
+    logger.info(f"   Interactive: http://localhost:{PORT}/docs")
+    logger.info(f"   OpenAPI: http://localhost:{PORT}/openapi.json")
+    await utils.open_pg_pool()
+    
+    # Batch api_logs and message/conversation writes in the background
+    app.state.api_log_task = asyncio.create_task(utils.drain_api_logs())
+    utils.message_batcher.start()
+    
     logger.info("🚀 Application Ready!")
-    logger.info(f"   - Gemini AI: {'✅ Enabled' if CONTINUOUS_CHAT_ENABLED else '❌ Disabled'}")
-    logger.info(f"   - WhatsApp: {'✅ Configured' if (ACCESS_TOKEN and PHONE_NUMBER_ID) else '❌ Not Configured'}")
-    logger.info(f"   - Database: {'✅ Connected' if SUPABASE_URL else '❌ Not Connected'}")
 
-@app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on app shutdown"""
     logger.info("🛑 Application Shutting Down...")
+    await utils.message_batcher.stop()
+    api_log_task = getattr(app.state, "api_log_task", None)
+    if api_log_task:
+        api_log_task.cancel()
+        try:
+            await api_log_task
+        except asyncio.CancelledError:
+            pass
+    await utils.close_http_client()
+    await utils.close_pg_pool()
+    log_listener.stop()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """App lifespan: startup work, then cleanup (shared HTTP clients, log queue) on exit"""
+    await startup_event()
+    yield
+    await shutdown_event()
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson (datetimes/UUIDs natively, much faster on large lists)"""
+    
+    def render(self, content: Any) -> bytes:
+        # Breakdown dicts are keyed by DB values, which may be None/ints
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+# Initialize FastAPI app
+app = FastAPI(
+    title=APP_TITLE,
+    version=APP_VERSION,
+    description=APP_DESCRIPTION,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 # ============ RESPONSE HEADER MIDDLEWARE ============
 
+# Security and standard headers, pre-encoded once for every response
+_STATIC_HEADERS = [
+    (b"x-api-version", APP_VERSION.encode()),
+    (b"x-api-name", b"WhatsApp Business API v4.0"),
+    (b"cache-control", b"no-cache, no-store, must-revalidate"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+]
+
 @app.middleware("http")
 async def add_response_headers(request: Request, call_next):
     """Add standard headers to all responses"""
     response = await call_next(request)
     
-    # Add security and standard headers
-    response.headers["X-API-Version"] = APP_VERSION
-    response.headers["X-API-Name"] = "WhatsApp Business API v4.0"
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
+    response.raw_headers.extend(_STATIC_HEADERS)
     
     # Log request/response
-    client_host = request.client.host if request.client else "unknown"
-    logger.info(
-        f"{request.method} {request.url.path} - Status: {response.status_code} - Client: {client_host}"
-    )
+    if logger.isEnabledFor(logging.INFO):
+        client_host = request.client.host if request.client else "unknown"
+        logger.info(
+            "%s %s - Status: %s - Client: %s",
+            request.method, request.url.path, response.status_code, client_host
+        )
     
     return response
 
 # ============ HEALTH CHECK ENDPOINTS ============
 
+# Static bodies for the health-checked endpoints, built once at import
+_ROOT_BODY = {
+    "title": APP_TITLE + " ",
+    "version": APP_VERSION,
+    "status": "operational",
+    "description": APP_DESCRIPTION,
+    "features": [
+        " WhatsApp Business API Integration",
+        " Multi-Agent Team Collaboration",
+        " Lead Management & CRM",
+        " AI-Powered Auto-Replies (Gemini 2.5 Pro)",
+        " Analytics & Performance Tracking",
+        " Conversation Tracking with Message Status"
+    ],
+    "authentication": {
+        "status": "disabled",
+        "note": "JWT authentication temporarily disabled for development"
+    },
+    "documentation": {
+        "interactive_docs": "/docs",
+        "openapi_spec": "/openapi.json"
+    }
+}
+
+_ENVIRONMENT_DEBUG = {
+    "SUPABASE_URL": "SET" if SUPABASE_URL else "MISSING",
+    "SUPABASE_ANON_KEY": "SET" if SUPABASE_KEY else "MISSING", 
+    "SUPABASE_SERVICE_ROLE_KEY": "SET" if SUPABASE_SERVICE_KEY else "MISSING",
+    "ACCESS_TOKEN": "SET" if ACCESS_TOKEN else "MISSING",
+    "PHONE_NUMBER_ID": "SET" if PHONE_NUMBER_ID else "MISSING",
+    "WABA_ID": "SET" if WABA_ID else "MISSING",
+    "VERIFY_TOKEN": "SET" if VERIFY_TOKEN else "MISSING",
+    "GEMINI_API_KEY": "SET" if GEMINI_API_KEY else "MISSING"
+}
+
+_WHATSAPP_CONFIGURED = bool(ACCESS_TOKEN and PHONE_NUMBER_ID)
+_DATABASE_CONFIGURED = bool(SUPABASE_URL and SUPABASE_KEY)
+
 @app.get("/")
 async def root():
     """API Documentation - Public endpoint (no authentication required)"""
-    return {
-        "title": APP_TITLE + " ",
-        "version": APP_VERSION,
-        "status": "operational",
-        "description": APP_DESCRIPTION,
-        "features": [
-            " WhatsApp Business API Integration",
-            " Multi-Agent Team Collaboration",
-            " Lead Management & CRM",
-            " AI-Powered Auto-Replies (Gemini 2.5 Pro)",
-            " Analytics & Performance Tracking",
-            " Conversation Tracking with Message Status"
-        ],
-        "authentication": {
-            "status": "disabled",
-            "note": "JWT authentication temporarily disabled for development"
-        },
-        "documentation": {
-            "interactive_docs": "/docs",
-            "openapi_spec": "/openapi.json"
-        }
-    }
+    return ORJSONResponse(_ROOT_BODY)
 
 @app.get("/status")
 async def api_status():
     """API Health Check with environment variable debugging"""
-    return {
+    return ORJSONResponse({
         "status": "healthy",
         "version": APP_VERSION,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": utils.now_iso(),
         "services": {
-            "whatsapp": bool(ACCESS_TOKEN and PHONE_NUMBER_ID),
-            "gemini": SERVICE_STATUS.get("gemini", False),
-            "database": bool(SUPABASE_URL and SUPABASE_KEY)
+            "whatsapp": _WHATSAPP_CONFIGURED,
+            "gemini": SERVICE_STATUS.get("gemini", False),  # set at startup
+            "database": _DATABASE_CONFIGURED
         },
-        "environment_debug": {
-            "SUPABASE_URL": "SET" if SUPABASE_URL else "MISSING",
-            "SUPABASE_ANON_KEY": "SET" if SUPABASE_KEY else "MISSING", 
-            "SUPABASE_SERVICE_ROLE_KEY": "SET" if SUPABASE_SERVICE_KEY else "MISSING",
-            "ACCESS_TOKEN": "SET" if ACCESS_TOKEN else "MISSING",
-            "PHONE_NUMBER_ID": "SET" if PHONE_NUMBER_ID else "MISSING",
-            "WABA_ID": "SET" if WABA_ID else "MISSING",
-            "VERIFY_TOKEN": "SET" if VERIFY_TOKEN else "MISSING",
-            "GEMINI_API_KEY": "SET" if GEMINI_API_KEY else "MISSING"
-        }
-    }
+        "environment_debug": _ENVIRONMENT_DEBUG
+    })
+
+# The spec never changes after startup, so serialize it once per format
+@lru_cache(maxsize=1)
+def openapi_json_bytes() -> bytes:
+    return orjson.dumps(app.openapi())
 
-@app.get("/api/spec", response_class=JSONResponse)
+@lru_cache(maxsize=1)
+def openapi_yaml_bytes() -> bytes:
+    return yaml.dump(app.openapi(), default_flow_style=False, allow_unicode=True).encode()
+
+@app.get("/api/spec", response_class=Response)
 async def get_openapi_spec():
     """Get OpenAPI specification as JSON"""
-    return app.openapi()
+    return Response(content=openapi_json_bytes(), media_type="application/json")
 
-@app.get("/swagger.json", response_class=JSONResponse)
+@app.get("/swagger.json", response_class=Response)
 async def get_swagger_spec():
     """Download Swagger/OpenAPI specification (JSON format)"""
-    spec = app.openapi()
-    if not spec:
+    if not app.openapi():
         raise HTTPException(status_code=404, detail="OpenAPI spec not generated")
-    return spec
+    return Response(content=openapi_json_bytes(), media_type="application/json")
 
-@app.get("/swagger.yaml", response_class=FileResponse)
+@app.get("/swagger.yaml", response_class=Response)
 async def download_swagger_yaml():
     """Download Swagger specification as YAML file"""
-    import yaml
-    spec = app.openapi()
-    if not spec:
+    if not app.openapi():
         raise HTTPException(status_code=404, detail="OpenAPI spec not generated")
     
-    # Create temporary YAML file
-    yaml_content = yaml.dump(spec, default_flow_style=False, allow_unicode=True)
-    temp_file = "/tmp/swagger.yaml"
-    
-    try:
-        with open(temp_file, 'w') as f:
-            f.write(yaml_content)
-        return FileResponse(
-            temp_file,
-            media_type="application/x-yaml",
-            filename="swagger.yaml"
-        )
-    except ImportError:
-        return JSONResponse(
+    if not _YAML_OK:
+        return ORJSONResponse(
             {
                 "message": "YAML file download requires PyYAML library",
                 "alternative": "Use /swagger.json for JSON format",
@@ -222,6 +305,12 @@ async def download_swagger_yaml():
             },
             status_code=200
         )
+    
+    return Response(
+        content=openapi_yaml_bytes(),
+        media_type="application/x-yaml",
+        headers={"Content-Disposition": 'attachment; filename="swagger.yaml"'}
+    )
 
 # ============ WHATSAPP WEBHOOK ENDPOINTS ============
 
@@ -243,97 +332,157 @@ async def verify_webhook(
             else:
                 logger.warning(f" Invalid verify token. Expected: {VERIFY_TOKEN}, Got: {hub_verify_token}")
                 await utils.log_api_call("/webhook", "GET", None, 403, "Invalid verify token")
-                return JSONResponse({"error": "Invalid verify token"}, status_code=403)
+                return ORJSONResponse({"error": "Invalid verify token"}, status_code=403)
         
         logger.warning(f" Invalid mode: {hub_mode}")
         await utils.log_api_call("/webhook", "GET", None, 400, "Invalid mode")
-        return JSONResponse({"error": "Invalid mode"}, status_code=400)
+        return ORJSONResponse({"error": "Invalid mode"}, status_code=400)
     except Exception as e:
         logger.error(f"Webhook verification error: {e}")
         await utils.log_api_call("/webhook", "GET", None, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
+
+# Caps how many webhook items run at once across all deliveries
+_webhook_semaphore = asyncio.Semaphore(MESSAGE_CONCURRENCY)
+
+# Once this many items are already pending, new deliveries get a 503 and Meta redelivers later
+# (checked against the backlog only, so one large delivery is still accepted when idle)
+MAX_PENDING_WEBHOOK_JOBS = 100
+_pending_webhook_jobs = 0
+
+# Meta deliveries are a few KB; anything far larger is rejected before it is buffered
+MAX_WEBHOOK_BODY_BYTES = 2 * 1024 * 1024
+
+async def read_webhook_body(request: Request) -> Optional[bytes]:
+    """Read the request body from the stream, or None once it exceeds MAX_WEBHOOK_BODY_BYTES"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_WEBHOOK_BODY_BYTES:
+        return None
+    
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_WEBHOOK_BODY_BYTES:
+            return None
+    return bytes(body)
+
+async def _run_limited(coro):
+    """Await a webhook job under the shared concurrency limit"""
+    async with _webhook_semaphore:
+        return await coro
+
+async def process_sender_messages(messages: List[Dict[str, Any]]):
+    """Handle one sender's messages in delivery order (other senders run in parallel)"""
+    for message in messages:
+        await process_incoming_message(message)
+
+async def process_webhook_jobs(jobs: List[Any]):
+    """Run queued webhook jobs concurrently; one failure doesn't stop the rest"""
+    global _pending_webhook_jobs
+    # Counted only while the jobs actually run, so a task that never starts can't leak
+    _pending_webhook_jobs += len(jobs)
+    try:
+        results = await asyncio.gather(*(_run_limited(job) for job in jobs), return_exceptions=True)
+    finally:
+        _pending_webhook_jobs -= len(jobs)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Webhook job failed: %s", result, exc_info=result)
 
 @app.post("/webhook")
-async def receive_webhook(request: Request):
+async def receive_webhook(request: Request, background_tasks: BackgroundTasks):
     """Receive WhatsApp messages from Meta and auto-generate AI replies"""
     try:
-        # Get raw body first
-        raw_body = await request.body()
+        # Get raw body first (size-capped; signature check needs all of it before parsing)
+        raw_body = await read_webhook_body(request)
+        if raw_body is None:
+            logger.warning(" Webhook body over %s bytes - rejected", MAX_WEBHOOK_BODY_BYTES)
+            return ORJSONResponse({"error": "Payload too large"}, status_code=413)
         
         # Log incoming request
-        logger.info(f" WEBHOOK RECEIVED - {request.client.host if request.client else 'unknown'}")
+        logger.info(" WEBHOOK RECEIVED - %s", request.client.host if request.client else 'unknown')
         
         # Handle empty body gracefully
         if not raw_body:
             logger.debug("Empty webhook body received (likely from Swagger test)")
-            return JSONResponse({"status": "received"})
+            return ORJSONResponse({"status": "received"})
         
-        # Try to parse JSON
+        # Parse + validate the envelope straight from bytes
         try:
-            body = json.loads(raw_body)
-        except json.JSONDecodeError as e:
-            logger.error(f" Invalid JSON in webhook: {e}")
-            return JSONResponse({"error": "Invalid JSON"}, status_code=400)
+            body = WebhookPayload.model_validate_json(raw_body)
+        except ValidationError as e:
+            logger.error(" Invalid webhook payload: %s", e)
+            return ORJSONResponse({"error": "Invalid JSON"}, status_code=400)
         
         # Log webhook structure
-        logger.debug(f"Webhook object: {body.get('object')}")
-        
-        # Verify webhook signature
-        x_hub_signature = request.headers.get("X-Hub-Signature-256", "")
-        if x_hub_signature:
-            is_valid = verify_webhook_signature(raw_body, x_hub_signature)
-            if not is_valid:
-                logger.warning("  Invalid webhook signature - but continuing anyway")
-            else:
-                logger.debug("✓ Webhook signature verified")
+        logger.debug("Webhook object: %s", body.object)
+        
+        # Nothing to do for other object types: skip the HMAC and the api_logs row
+        if body.object != "whatsapp_business_account":
+            logger.warning("  Unknown webhook object type: %s", body.object)
+            return ORJSONResponse({"status": "ignored"})
+        
+        # Verify webhook signature before acting on the payload
+        if WEBHOOK_SIGNING_KEY:
+            x_hub_signature = request.headers.get("X-Hub-Signature-256", "")
+            if not verify_webhook_signature(raw_body, x_hub_signature):
+                logger.warning("  Invalid or missing webhook signature - rejected")
+                await utils.log_api_call("/webhook", "POST", None, 401, "Invalid signature")
+                return ORJSONResponse({"error": "Invalid signature"}, status_code=401)
+            logger.debug("✓ Webhook signature verified")
         else:
-            logger.debug("No signature provided in webhook (verification skipped)")
+            logger.debug("APP_SECRET not set (signature verification skipped)")
         
         # Process messages
-        entries_count = 0
+        entries_count = len(body.entry)
         messages_count = 0
         status_updates_count = 0
         template_updates_count = 0
-        
-        if body.get("object") == "whatsapp_business_account":
-            for entry in body.get("entry", []):
-                entries_count += 1
-                for change in entry.get("changes", []):
-                    value = change.get("value", {})
-                    messages = value.get("messages", [])
-                    statuses = value.get("statuses", [])
-                    
-                    # Process incoming messages
-                    for message in messages:
-                        messages_count += 1
-                        logger.info(f" Processing incoming message from {message.get('from')}")
-                        await process_incoming_message(message)
-                    
-                    # Process message status updates
-                    for status in statuses:
-                        status_updates_count += 1
-                        logger.info(f" Processing status update for message {status.get('id')}")
-                        await process_message_status(status)
-                    
-                    # Process template status updates (when Meta approves/rejects templates)
-                    # Meta sends template updates in `message_template_status_update` field
-                    if "message_template_status_update" in value:
-                        template_updates_count += 1
-                        logger.info(f" Processing template status update")
-                        await process_template_status_update(value["message_template_status_update"])
-        else:
-            logger.warning(f"  Unknown webhook object type: {body.get('object')}")
+        jobs = []
+        messages_by_sender: Dict[str, List[Dict[str, Any]]] = {}
+        
+        # One flat pass over every change.value across all entries
+        for entry_time, value in ((entry.time, change.value) for entry in body.entry for change in entry.changes):
+            # Process incoming messages
+            for message in value.messages:
+                messages_count += 1
+                logger.info(" Processing incoming message from %s", message.get('from'))
+                messages_by_sender.setdefault(message.get('from'), []).append(message)
+            
+            # Process message status updates
+            for status in value.statuses:
+                status_updates_count += 1
+                logger.info(" Processing status update for message %s", status.get('id'))
+                jobs.append(process_message_status(status))
+            
+            # Process template status updates (when Meta approves/rejects templates)
+            # Meta sends template updates in `message_template_status_update` field
+            if value.message_template_status_update is not None:
+                template_updates_count += 1
+                logger.info(" Processing template status update")
+                jobs.append(process_template_status_update(value.message_template_status_update, entry_time))
+        
+        jobs.extend(process_sender_messages(messages) for messages in messages_by_sender.values())
+        
+        # Acknowledge Meta right away; replies (Gemini + Graph API) run after the response
+        if jobs:
+            if _pending_webhook_jobs >= MAX_PENDING_WEBHOOK_JOBS:
+                for job in jobs:
+                    job.close()
+                logger.warning(" Webhook backlog full (%s pending) - asking Meta to retry", _pending_webhook_jobs)
+                return ORJSONResponse({"error": "Busy, retry later"}, status_code=503)
+            background_tasks.add_task(process_webhook_jobs, jobs)
         
         # Log summary
-        logger.info(f"✓ Webhook processed - Entries: {entries_count}, Messages: {messages_count}, Status Updates: {status_updates_count}, Template Updates: {template_updates_count}")
+        logger.info("✓ Webhook accepted - Entries: %s, Messages: %s, Status Updates: %s, Template Updates: %s", entries_count, messages_count, status_updates_count, template_updates_count)
         
         await utils.log_api_call("/webhook", "POST", None, 200)
-        return JSONResponse({"status": "received"})
+        return ORJSONResponse({"status": "received"})
     
     except Exception as e:
-        logger.error(f"Webhook error: {e}", exc_info=True)
+        logger.error("Webhook error: %s", e, exc_info=True)
         await utils.log_api_call("/webhook", "POST", None, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 async def process_incoming_message(message: Dict[str, Any]):
     """Process incoming WhatsApp message and send automatic reply
@@ -344,28 +493,41 @@ async def process_incoming_message(message: Dict[str, Any]):
     3. Store reply in messages table with status: sent
     """
     try:
-        phone = message.get("from")
-        text = message.get("text", {}).get("body", "")
+        try:
+            phone = message["from"]
+            text = message["text"]["body"]
+        except (KeyError, TypeError):
+            phone = text = None
         message_id = message.get("id")
         timestamp = message.get("timestamp")
         
+        # Meta redelivers on slow acks; never reply to the same message twice
+        if not await utils.first_time_seen(f"msg:{message_id}" if message_id else None):
+            logger.info(" Duplicate delivery of message %s - skipped", message_id)
+            return
+        
         if not phone or not text:
-            logger.warning(f"  Invalid message: phone or text missing")
+            logger.warning("  Invalid message: phone or text missing")
             return
         
         # Normalize phone
-        phone_clean = phone.replace("+", "").replace(" ", "")
-        if not phone_clean.startswith("91"):
-            phone_clean = "91" + phone_clean
+        phone_clean = utils.normalize_phone(phone)
+        
+        logger.info(" Incoming message from %s: %s", phone_clean, text[:50])
         
-        logger.info(f" Incoming message from {phone_clean}: {text[:50]}")
+        # Start the (blocking, >1s) Gemini call now so it overlaps the DB writes below
+        reply_task = None
+        if CONTINUOUS_CHAT_ENABLED:
+            reply_task = asyncio.create_task(
+                asyncio.to_thread(chat_handler.handle_product_inquiry, text, phone_clean)
+            )
         
         # Create/update lead (for conversation grouping)
         success, lead = await utils.store_lead(phone_clean, f"Customer {phone_clean}")
         if not success:
-            logger.warning(f" Could not store lead for {phone_clean}")
+            logger.warning(" Could not store lead for %s", phone_clean)
         else:
-            logger.debug(f"✓ Lead created/updated: {phone_clean}")
+            logger.debug("✓ Lead created/updated: %s", phone_clean)
         
         # Store in BOTH messages and conversations tables using unified function
         db_success, msg_data = await store_conversation_with_message(
@@ -375,24 +537,25 @@ async def process_incoming_message(message: Dict[str, Any]):
             direction="inbound",
             status="received",
             sender_type="customer",
-            message_id=message_id
+            message_id=message_id,
+            lead_id=lead.get("id")
         )
         
         # Add to in-memory storage
-        utils.add_to_recent_messages(text, phone_clean, phone_clean, "received")
+        await utils.add_to_recent_messages(text, phone_clean, phone_clean, "received")
         
         if db_success:
-            logger.info(f"✓ Incoming message stored for {phone_clean}")
+            logger.info("✓ Incoming message stored for %s", phone_clean)
         else:
-            logger.warning(f" Failed to store incoming message for {phone_clean}")
+            logger.warning(" Failed to store incoming message for %s", phone_clean)
         
         # ============ GENERATE RESPONSE USING CONTINUOUS CHAT ============
         
-        if CONTINUOUS_CHAT_ENABLED:
+        if reply_task:
             # Use Continuous Chat with Gemini AI for intelligent responses
             try:
-                logger.debug(f"Using Continuous Chat to generate response for {phone_clean}")
-                result = chat_handler.handle_product_inquiry(text, phone_clean)
+                logger.debug("Using Continuous Chat to generate response for %s", phone_clean)
+                result = await reply_task
                 reply_text = result.get('response', '')
                 
                 if not reply_text:
@@ -400,22 +563,22 @@ async def process_incoming_message(message: Dict[str, Any]):
                     reply_text = "Thank you for your message! We're processing your inquiry."
                     
             except Exception as e:
-                logger.error(f"Error in continuous chat: {e}")
+                logger.error("Error in continuous chat: %s", e)
                 reply_text = "Thank you for contacting Katyayani Organics! We will get back to you shortly."
         else:
             # Fallback to default reply if continuous chat is disabled
             reply_text = "Thank you for contacting Katyayani Organics! We will get back to you shortly."
         
-        logger.debug(f"Generated reply: {reply_text[:100]}...")
-        logger.debug(f"Sending response to {phone_clean}...")
-        success, reply_msg_id = utils.send_whatsapp_message(
+        logger.debug("Generated reply: %s...", reply_text[:100])
+        logger.debug("Sending response to %s...", phone_clean)
+        success, reply_msg_id = await utils.send_whatsapp_message(
             PHONE_NUMBER_ID, ACCESS_TOKEN, phone_clean, reply_text
         )
         
         if success:
             # If no msg_id from API, generate UUID
             if not reply_msg_id:
-                reply_msg_id = str(uuid.uuid4())
+                reply_msg_id = secrets.token_hex(16)
             
             # Store reply using unified function
             reply_success, reply_data = await store_conversation_with_message(
@@ -425,22 +588,43 @@ async def process_incoming_message(message: Dict[str, Any]):
                 direction="outbound",
                 status="sent",
                 sender_type="agent",
-                message_id=reply_msg_id
+                message_id=reply_msg_id,
+                lead_id=lead.get("id")
             )
             
-            utils.add_to_recent_messages(reply_text, "Katyayani Organics", phone_clean, "sent")
+            await utils.add_to_recent_messages(reply_text, "Katyayani Organics", phone_clean, "sent")
             
             if reply_success:
-                logger.info(f"✓ AI response sent and stored for {phone_clean} (ID: {reply_msg_id})")
+                logger.info("✓ AI response sent and stored for %s (ID: %s)", phone_clean, reply_msg_id)
             else:
-                logger.warning(f" AI response sent but storage failed for {phone_clean}")
+                logger.warning(" AI response sent but storage failed for %s", phone_clean)
         else:
-            logger.warning(f" Failed to send AI response to {phone_clean}")
+            logger.warning(" Failed to send AI response to %s", phone_clean)
         
         await utils.log_api_call("/webhook", "POST", phone_clean, 200)
         
     except Exception as e:
-        logger.error(f" Error processing incoming message: {e}", exc_info=True)
+        logger.error(" Error processing incoming message: %s", e, exc_info=True)
+
+# Meta message status -> our status values
+MESSAGE_STATUS_MAP = {
+    "sent": "sent",
+    "delivered": "delivered",
+    "read": "seen",
+    "failed": "failed"
+}
+
+# Meta template events -> our status values
+TEMPLATE_STATUS_MAP = {
+    "APPROVED": "APPROVED",
+    "REJECTED": "REJECTED",
+    "PENDING": "PENDING",
+    "PENDING_DELETION": "PENDING_DELETION",
+    "DELETED": "DELETED",
+    "DISABLED": "DISABLED",
+    "PAUSED": "PAUSED",
+    "LIMIT_EXCEEDED": "REJECTED"
+}
 
 async def process_message_status(status: Dict[str, Any]):
     """Process WhatsApp message status update from Meta webhook
@@ -452,32 +636,25 @@ async def process_message_status(status: Dict[str, Any]):
         phone = status.get("recipient_id")
         message_id = status.get("id")
         msg_status = status.get("status")  # Values: sent, delivered, read, failed
-        error_code = status.get("errors", [{}])[0].get("code") if status.get("errors") else None
-        error_message = status.get("errors", [{}])[0].get("message") if status.get("errors") else None
+        error = (status.get("errors") or [{}])[0]
+        error_code, error_message = error.get("code"), error.get("message")
         
         if not phone or not message_id or not msg_status:
-            logger.warning(f"Invalid status update: missing required fields")
+            logger.warning("Invalid status update: missing required fields")
+            return
+        
+        if not await utils.first_time_seen(f"status:{message_id}:{msg_status}"):
+            logger.debug("Duplicate status %s for %s - skipped", msg_status, message_id)
             return
         
         # Normalize phone
-        phone_clean = phone.replace("+", "").replace(" ", "")
-        if not phone_clean.startswith("91"):
-            phone_clean = "91" + phone_clean
-        
-        # Map Meta status to our status values
-        status_map = {
-            "sent": "sent",
-            "delivered": "delivered",
-            "read": "seen",
-            "failed": "failed"
-        }
+        phone_clean = utils.normalize_phone(phone)
         
-        db_status = status_map.get(msg_status, msg_status)
+        db_status = MESSAGE_STATUS_MAP.get(msg_status, msg_status)
         
-        logger.info(f"Message status update: {phone_clean} / {message_id} → {db_status}")
+        logger.info("Message status update: %s / %s → %s", phone_clean, message_id, db_status)
         
         # Update message status in database using message_id
-        from utils import update_message_status
         success = await update_message_status(
             message_id=message_id,
             status=db_status,
@@ -485,16 +662,16 @@ async def process_message_status(status: Dict[str, Any]):
         )
         
         if success:
-            logger.info(f"✓ Message {message_id} status updated to {db_status} in database")
+            logger.info("✓ Message %s status updated to %s in database", message_id, db_status)
         else:
-            logger.warning(f"Could not update status for message {message_id} in database")
+            logger.warning("Could not update status for message %s in database", message_id)
         
         await utils.log_api_call("/webhook/status", "POST", phone_clean, 200, f"Status: {db_status}")
         
     except Exception as e:
-        logger.error(f"Error processing message status: {e}", exc_info=True)
+        logger.error("Error processing message status: %s", e, exc_info=True)
 
-async def process_template_status_update(template_status: Dict[str, Any]):
+async def process_template_status_update(template_status: Dict[str, Any], entry_time: Optional[int] = None):
     """Process WhatsApp template status update from Meta webhook
     
     When Meta approves/rejects a template, they send webhook with:
@@ -504,6 +681,8 @@ async def process_template_status_update(template_status: Dict[str, Any]):
     - reason: Reason if rejected
     
     This automatically updates Supabase with the new status.
+    Redeliveries are recognised by template ID + entry time, so a template that
+    legitimately returns to an earlier status (APPROVED → PAUSED → APPROVED) is still applied.
     """
     try:
         template_name = template_status.get("message_template_name")
@@ -512,77 +691,79 @@ async def process_template_status_update(template_status: Dict[str, Any]):
         reason = template_status.get("reason", "")
         
         if not template_name or not event:
-            logger.warning(f"Invalid template status update: missing required fields")
+            logger.warning("Invalid template status update: missing required fields")
             return
         
-        logger.info(f"Template status update: {template_name} → {event}")
-        
-        # Map Meta events to our status values
-        status_map = {
-            "APPROVED": "APPROVED",
-            "REJECTED": "REJECTED",
-            "PENDING": "PENDING",
-            "PENDING_DELETION": "PENDING_DELETION",
-            "DELETED": "DELETED",
-            "DISABLED": "DISABLED",
-            "PAUSED": "PAUSED",
-            "LIMIT_EXCEEDED": "REJECTED"
-        }
+        delivery_key = f"template:{template_id or template_name}:{event}:{entry_time}" if entry_time else None
+        if not await utils.first_time_seen(delivery_key):
+            logger.debug("Duplicate template event %s for %s - skipped", event, template_name)
+            return
+        
+        logger.info("Template status update: %s → %s", template_name, event)
         
-        db_status = status_map.get(event, event)
+        db_status = TEMPLATE_STATUS_MAP.get(event, event)
         
         # Update template status in Supabase
         if SUPABASE_URL and SUPABASE_KEY:
             try:
-                headers = utils.get_supabase_headers()
-                
                 # Update by template_name
                 update_data = {
                     "status": db_status,
-                    "updated_at": datetime.now().isoformat()
+                    "updated_at": utils.utc_now_iso()
                 }
                 
                 if reason:
                     update_data["rejection_reason"] = reason
                 
-                response = requests.patch(
-                    f"{SUPABASE_URL}/rest/v1/templates?template_name=eq.{template_name}",
-                    headers=headers,
-                    json=update_data,
-                    timeout=10
-                )
-                
-                if response.status_code in [200, 204]:
-                    logger.info(f"✓ Template {template_name} status updated to {db_status} in Supabase")
+                if utils.pg_pool is not None:
+                    await utils.pg_pool.execute(
+                        "UPDATE templates SET status = $1, updated_at = now(), "
+                        "rejection_reason = COALESCE($2, rejection_reason) WHERE template_name = $3",
+                        db_status, reason or None, template_name
+                    )
+                    logger.info("✓ Template %s status updated to %s in Supabase", template_name, db_status)
                 else:
-                    logger.warning(f"Could not update template status: {response.status_code} - {response.text[:200]}")
+                    response = await utils.supabase_client.patch(
+                        "/rest/v1/templates",
+                        params={"template_name": f"eq.{template_name}"},
+                        json=update_data
+                    )
+                    
+                    if response.status_code in [200, 204]:
+                        logger.info("✓ Template %s status updated to %s in Supabase", template_name, db_status)
+                    else:
+                        logger.warning("Could not update template status: %s - %s", response.status_code, response.text[:200])
             
             except Exception as db_error:
-                logger.error(f"Database update error for template {template_name}: {db_error}")
+                logger.error("Database update error for template %s: %s", template_name, db_error)
         
         await utils.log_api_call("/webhook/template-status", "POST", None, 200, f"Template: {template_name} → {db_status}")
     
     except Exception as e:
-        logger.error(f"Error processing template status: {e}", exc_info=True)
+        logger.error("Error processing template status: %s", e, exc_info=True)
+
+# Meta signs webhooks with the app secret; encoded once instead of on every webhook
+WEBHOOK_SIGNING_KEY = APP_SECRET.encode() if APP_SECRET else b""
+SIGNATURE_HEADER_LENGTH = len("sha256=") + 64
 
 def verify_webhook_signature(body: bytes, signature: str) -> bool:
     """Verify Meta webhook signature"""
     try:
-        if not signature or not SUPABASE_KEY:
+        if not signature or not WEBHOOK_SIGNING_KEY:
             return False
         
-        # Expected format: sha256=<hash>
-        if not signature.startswith("sha256="):
+        # Expected format: sha256=<64 hex chars>; anything else is rejected before hashing the body
+        if len(signature) != SIGNATURE_HEADER_LENGTH or not signature.startswith("sha256="):
             return False
         
-        expected_hash = signature.replace("sha256=", "")
-        actual_hash = hmac.new(
-            SUPABASE_KEY.encode(),
-            body,
-            hashlib.sha256
-        ).hexdigest()
+        # Compare raw digests: no hex encoding of our side, one parse of theirs
+        try:
+            expected = bytes.fromhex(signature[7:])
+        except ValueError:
+            return False
+        actual = hmac.digest(WEBHOOK_SIGNING_KEY, body, "sha256")
         
-        return hmac.compare_digest(expected_hash, actual_hash)
+        return hmac.compare_digest(expected, actual)
     except Exception as e:
         logger.error(f"Signature verification error: {e}")
         return False
@@ -594,20 +775,18 @@ async def send_message(request: MessageCreate):
     """Send WhatsApp message and store in database with live status tracking"""
     try:
         # Normalize phone number
-        phone = request.phone.replace("+", "").replace(" ", "")
-        if not phone.startswith("91"):
-            phone = "91" + phone
+        phone = utils.normalize_phone(request.phone)
         
         if not ACCESS_TOKEN or not PHONE_NUMBER_ID:
             logger.error("WhatsApp not configured: ACCESS_TOKEN or PHONE_NUMBER_ID is missing")
             await utils.log_api_call("/send-message", "POST", phone, 503, "WhatsApp not configured")
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "WhatsApp not configured. Please set ACCESS_TOKEN and PHONE_NUMBER_ID in .env"},
                 status_code=503
             )
         
         logger.info(f"Sending message to {phone}")
-        success, msg_id = utils.send_whatsapp_message(
+        success, msg_id = await utils.send_whatsapp_message(
             PHONE_NUMBER_ID,
             ACCESS_TOKEN,
             phone,
@@ -617,10 +796,10 @@ async def send_message(request: MessageCreate):
         if success:
             # If no message_id from API, generate UUID
             if not msg_id:
-                msg_id = str(uuid.uuid4())
+                msg_id = secrets.token_hex(16)
             
             # Store in both memory and database using unified function
-            utils.add_to_recent_messages(request.message, "Agent", phone, "sent")
+            await utils.add_to_recent_messages(request.message, "Agent", phone, "sent")
             
             # Store message and conversation together
             db_success, db_data = await store_conversation_with_message(
@@ -640,20 +819,20 @@ async def send_message(request: MessageCreate):
             else:
                 logger.warning(f"Message sent but storage failed for {phone} (ID: {msg_id})")
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message_id": msg_id,
                 "phone": phone,
                 "message_status": "sent",
                 "stored_in_supabase": db_success,
-                "sent_at": datetime.now().isoformat(),
+                "sent_at": utils.now_iso(),
                 "live_tracking": "You can check status via /message-status or /recent-messages endpoints"
             })
         else:
             error_msg = f"Failed to send WhatsApp message to {phone}. Possible causes: (1) Invalid ACCESS_TOKEN, (2) Invalid PHONE_NUMBER_ID, (3) Recipient not on WhatsApp"
             logger.error(error_msg)
             await utils.log_api_call("/send-message", "POST", phone, 500, error_msg)
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "Failed to send message", "details": error_msg},
                 status_code=500
             )
@@ -661,16 +840,14 @@ async def send_message(request: MessageCreate):
     except Exception as e:
         logger.error(f"Send message error: {e}", exc_info=True)
         await utils.log_api_call("/send-message", "POST", request.phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.post("/send-media")
 async def send_media(request: MediaMessageCreate) -> MessageResponse:
     """Send media (image/video/document/file/audio) via WhatsApp"""
     try:
         # Normalize phone number
-        phone = request.phone.replace("+", "").replace(" ", "")
-        if not phone.startswith("91"):
-            phone = "91" + phone
+        phone = utils.normalize_phone(request.phone)
         
         # Convert media_type enum to string
         media_type_str = str(request.media_type).lower()
@@ -680,7 +857,7 @@ async def send_media(request: MediaMessageCreate) -> MessageResponse:
         if not ACCESS_TOKEN or not PHONE_NUMBER_ID:
             logger.error("WhatsApp not configured")
             await utils.log_api_call("/send-media", "POST", phone, 503, "WhatsApp not configured")
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "WhatsApp not configured"},
                 status_code=503
             )
@@ -688,7 +865,7 @@ async def send_media(request: MediaMessageCreate) -> MessageResponse:
         logger.info(f"Sending {media_type_str} to {phone}")
         logger.debug(f"Media URL: {request.media_url}")
         
-        success, msg_id = send_media_message(
+        success, msg_id = await send_media_message(
             PHONE_NUMBER_ID,
             ACCESS_TOKEN,
             phone,
@@ -700,11 +877,11 @@ async def send_media(request: MediaMessageCreate) -> MessageResponse:
         
         if success:
             media_caption = f"{media_type_str.upper()}: {request.caption or request.media_url}"
-            utils.add_to_recent_messages(media_caption, "Agent", phone, "sent")
+            await utils.add_to_recent_messages(media_caption, "Agent", phone, "sent")
             
             # If no message_id from API, generate UUID
             if not msg_id:
-                msg_id = str(uuid.uuid4())
+                msg_id = secrets.token_hex(16)
             
             # Store message and conversation together
             db_success, db_data = await store_conversation_with_message(
@@ -727,27 +904,27 @@ async def send_media(request: MediaMessageCreate) -> MessageResponse:
             else:
                 logger.warning(f"Media sent but storage failed for {phone}")
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message_id": msg_id,
                 "phone": phone,
                 "message_type": media_type_str,
                 "media_url": request.media_url,
                 "stored_in_supabase": db_success,
-                "sent_at": datetime.now().isoformat()
+                "sent_at": utils.now_iso()
             })
         else:
             error_msg = f"Failed to send {media_type_str} to {phone}. Possible causes: (1) Invalid ACCESS_TOKEN, (2) Media URL not accessible, (3) Recipient not on WhatsApp"
             logger.error(error_msg)
             await utils.log_api_call("/send-media", "POST", phone, 500, error_msg)
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "Failed to send media", "details": error_msg},
                 status_code=500
             )
     except Exception as e:
         logger.error(f"Send media error: {e}", exc_info=True)
         await utils.log_api_call("/send-media", "POST", request.phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.post("/send-template")
 async def send_template(request: TemplateSend) -> MessageResponse:
@@ -758,14 +935,12 @@ async def send_template(request: TemplateSend) -> MessageResponse:
     """
     try:
         # Normalize phone number
-        phone = request.phone.replace("+", "").replace(" ", "")
-        if not phone.startswith("91"):
-            phone = "91" + phone
+        phone = utils.normalize_phone(request.phone)
         
         if not ACCESS_TOKEN or not PHONE_NUMBER_ID:
             logger.error("WhatsApp not configured")
             await utils.log_api_call("/send-template", "POST", phone, 503, "WhatsApp not configured")
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "WhatsApp not configured"},
                 status_code=503
             )
@@ -775,7 +950,7 @@ async def send_template(request: TemplateSend) -> MessageResponse:
         # Convert variables dict to list of values
         variables_list = list(request.variables.values()) if request.variables else []
         
-        success, msg_id = send_template_message(
+        success, msg_id = await send_template_message(
             PHONE_NUMBER_ID,
             ACCESS_TOKEN,
             phone,
@@ -787,11 +962,11 @@ async def send_template(request: TemplateSend) -> MessageResponse:
         if success:
             # If no message_id from API, generate UUID for tracking
             if not msg_id:
-                msg_id = str(uuid.uuid4())
+                msg_id = secrets.token_hex(16)
                 logger.debug(f"Generated UUID for template message: {msg_id}")
             
             template_info = f"TEMPLATE: {request.template_id} with vars: {request.variables or {}}"
-            utils.add_to_recent_messages(template_info, "Agent", phone, "sent")
+            await utils.add_to_recent_messages(template_info, "Agent", phone, "sent")
             
             # Store message and conversation together
             db_success, db_data = await store_conversation_with_message(
@@ -811,7 +986,7 @@ async def send_template(request: TemplateSend) -> MessageResponse:
             else:
                 logger.warning(f"Template sent but storage failed for {phone}")
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message_id": msg_id,
                 "phone": phone,
@@ -819,21 +994,21 @@ async def send_template(request: TemplateSend) -> MessageResponse:
                 "template_id": request.template_id,
                 "variables_used": request.variables or {},
                 "message_stored": db_success,
-                "sent_at": datetime.now().isoformat(),
+                "sent_at": utils.now_iso(),
                 "live_tracking": "You can check status via /message-status or /recent-messages endpoints"
             })
         else:
             error_msg = f"Failed to send template '{request.template_id}' to {phone}. Possible causes: (1) Template not found, (2) Invalid variables, (3) Invalid phone number, (4) WhatsApp API error"
             logger.error(error_msg)
             await utils.log_api_call("/send-template", "POST", phone, 500, error_msg)
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "Failed to send template", "details": error_msg},
                 status_code=500
             )
     except Exception as e:
         logger.error(f"Send template error: {e}", exc_info=True)
         await utils.log_api_call("/send-template", "POST", request.phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.post("/message-status")
 async def update_message_status_endpoint(request: MessageStatusUpdate) -> MessageStatusResponse:
@@ -851,24 +1026,24 @@ async def update_message_status_endpoint(request: MessageStatusUpdate) -> Messag
         if success:
             await utils.log_api_call("/message-status", "POST", None, 200)
             logger.info(f"✓ Message {request.message_id} status updated to '{request.status}'")
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message_id": request.message_id,
                 "current_status": request.status,
-                "updated_at": datetime.now().isoformat()
+                "updated_at": utils.now_iso()
             })
         else:
             error_msg = f"Message {request.message_id} not found. Ensure database migration was run."
             logger.error(error_msg)
             await utils.log_api_call("/message-status", "POST", None, 404, error_msg)
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "Message not found", "details": error_msg},
                 status_code=404
             )
     except Exception as e:
         logger.error(f"Update status error: {e}", exc_info=True)
         await utils.log_api_call("/message-status", "POST", None, 500, str(e))
-        return JSONResponse({"error": f"Status update failed: {str(e)}", "error_type": type(e).__name__}, status_code=500)
+        return ORJSONResponse({"error": f"Status update failed: {str(e)}", "error_type": type(e).__name__}, status_code=500)
 
 @app.get("/message-status")
 async def get_message_status(message_id: str):
@@ -880,70 +1055,70 @@ async def get_message_status(message_id: str):
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
             await utils.log_api_call("/message-status", "GET", message_id, 503, "Database not configured")
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "Database not configured"},
                 status_code=503
             )
         
-        headers = utils.get_supabase_headers()
-        
-        # Query messages table by message_id
-        url = f"{SUPABASE_URL}/rest/v1/messages?message_id=eq.{message_id}&select=id,message_id,phone,message,direction,status,created_at,updated_at"
+        cached = utils.message_status_cache.get(message_id)
+        if cached is not None:
+            await utils.log_api_call("/message-status", "GET", message_id, 200)
+            return ORJSONResponse(cached)
         
+        # Query messages table by message_id; concurrent polls are batched into one IN query
         logger.debug(f"Fetching status for message: {message_id}")
-        response = requests.get(url, headers=headers, timeout=10)
+        status_code, msg, error_text = await utils.message_status_loader.load(message_id)
         
-        if response.status_code == 200:
-            messages = response.json()
-            
-            if not messages or not isinstance(messages, list) or len(messages) == 0:
+        if status_code == 200:
+            if msg is None:
                 logger.warning(f"Message not found: {message_id}")
                 await utils.log_api_call("/message-status", "GET", message_id, 404, "Message not found")
-                return JSONResponse({
+                return ORJSONResponse({
                     "status": "error",
                     "message_id": message_id,
                     "error": "Message not found in database",
                     "code": "NOT_FOUND"
                 }, status_code=404)
             
-            msg = messages[0]
             current_status = msg.get("status", "unknown")
             
             logger.info(f"✓ Retrieved status for {message_id}: {current_status}")
             await utils.log_api_call("/message-status", "GET", message_id, 200)
             
-            return JSONResponse({
+            body = {
                 "status": "success",
                 "message_id": message_id,
                 "current_status": current_status,
                 "phone": msg.get("phone"),
                 "direction": msg.get("direction"),
-                "message": msg.get("message", "").strip()[:100],  # First 100 chars
+                "message": (msg.get("message") or "").strip()[:100],  # First 100 chars
                 "created_at": msg.get("created_at"),
                 "updated_at": msg.get("updated_at"),
                 "live_tracking": "Status updates automatically from Meta webhook"
-            })
+            }
+            utils.message_status_cache.set(message_id, body, ttl=utils.MESSAGE_STATUS_TTL)
+            return ORJSONResponse(body)
         
-        elif response.status_code == 401:
+        elif status_code == 401:
             logger.error("Supabase authentication failed")
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "error": "Database authentication failed",
                 "code": "AUTH_FAILED"
             }, status_code=401)
         
         else:
-            logger.error(f"Failed to get message status: {response.status_code}")
-            await utils.log_api_call("/message-status", "GET", message_id, response.status_code, response.text[:100])
-            return JSONResponse({
+            logger.error(f"Failed to get message status: {status_code}")
+            await utils.log_api_call("/message-status", "GET", message_id, status_code, error_text[:100])
+            return ORJSONResponse({
                 "status": "error",
-                "error": f"Failed to retrieve message status (HTTP {response.status_code})",
+                "error": f"Failed to retrieve message status (HTTP {status_code})",
                 "code": "QUERY_FAILED"
-            }, status_code=response.status_code)
+            }, status_code=status_code)
     
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error("Status query timed out")
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "error": "Database query timed out",
             "code": "TIMEOUT"
@@ -952,7 +1127,7 @@ async def get_message_status(message_id: str):
     except Exception as e:
         logger.error(f"Get status error: {e}", exc_info=True)
         await utils.log_api_call("/message-status", "GET", message_id, 500, str(e)[:100])
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "error": f"Failed to get status: {str(e)[:100]}",
             "code": "INTERNAL_ERROR"
@@ -966,26 +1141,32 @@ async def get_sentiment(phone: str):
         
         if sentiment_data:
             await utils.log_api_call("/sentiment", "GET", phone, 200)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "analysis": sentiment_data,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": utils.now_iso()
             })
         else:
             await utils.log_api_call("/sentiment", "GET", phone, 404, "No messages found")
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "No messages found for sentiment analysis"},
                 status_code=404
             )
     except Exception as e:
         logger.error(f"Sentiment analysis error: {e}", exc_info=True)
         await utils.log_api_call("/sentiment", "GET", phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.get("/analytics")
 async def get_analytics(phone: Optional[str] = None):
     """Get message analytics"""
     try:
+        cache_key = ("/analytics", phone)
+        cached = utils.response_cache.get(cache_key)
+        if cached is not None:
+            await utils.log_api_call("/analytics", "GET", phone, 200)
+            return ORJSONResponse(cached)
+        
         stats = await utils.get_message_stats(phone)
         
         # Always return stats, even if empty (shows 0 values with no data)
@@ -998,67 +1179,190 @@ async def get_analytics(phone: Optional[str] = None):
             "failed_count": 0
         }
         
-        await utils.log_api_call("/analytics", "GET", phone, 200)
-        return JSONResponse({
+        body = {
             "status": "success",
             "phone": phone or "all",
             "stats": analytics,
             "period": "all_time",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": utils.now_iso(),
             "note": "Ensure messages are sent via /send-message or received via /receive-simple for stats to populate"
-        })
+        }
+        if stats:
+            utils.response_cache.set(cache_key, body, ttl=30)
+        
+        await utils.log_api_call("/analytics", "GET", phone, 200)
+        return ORJSONResponse(body)
     except Exception as e:
         logger.error(f"Analytics error: {e}", exc_info=True)
         await utils.log_api_call("/analytics", "GET", phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 # ============ CONVERSATION ENDPOINTS ============
 
+# Newest `limit` rows before the cursor, returned oldest-first
+CONVERSATION_PAGE_SQL = """
+    SELECT * FROM (
+        SELECT * FROM conversations
+        WHERE phone = $1 AND ($2::timestamp IS NULL OR created_at < $2)
+        ORDER BY created_at DESC
+        LIMIT $3
+    ) page
+    ORDER BY created_at
+"""
+
+# Oldest `limit` rows after the `after` cursor (and before `before`, if given)
+CONVERSATION_AFTER_SQL = """
+    SELECT * FROM conversations
+    WHERE phone = $1 AND ($2::timestamp IS NULL OR created_at < $2) AND created_at > $4
+    ORDER BY created_at
+    LIMIT $3
+"""
+STREAM_FLUSH_BYTES = 64 * 1024
+
+def parse_cursor(value: Optional[str]) -> Optional[datetime]:
+    """Parse a created_at cursor into the naive UTC datetime the timestamp column expects"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+async def stream_conversation_page(
+    phone_clean: str,
+    limit: int,
+    before: Optional[datetime],
+    after: Optional[datetime] = None
+):
+    """Yield the /get-conversation body, encoding rows with orjson as the cursor reads them
+    
+    Totals and next_cursor are only known at the end, so they follow the messages array.
+    """
+    sent = received = total = 0
+    oldest = newest = None
+    if after is None:
+        query, args = CONVERSATION_PAGE_SQL, (phone_clean, before, limit)
+    else:
+        query, args = CONVERSATION_AFTER_SQL, (phone_clean, before, limit, after)
+    buffer = bytearray(b'{"status":"success","phone":' + orjson.dumps(phone_clean) + b',"messages":[')
+    try:
+        async with utils.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(query, *args):
+                    if total:
+                        buffer += b","
+                    else:
+                        oldest = row["created_at"]
+                    newest = row["created_at"]
+                    buffer += orjson.dumps(dict(row))
+                    total += 1
+                    direction = row["direction"]
+                    if direction == "outbound":
+                        sent += 1
+                    elif direction == "inbound":
+                        received += 1
+                    if len(buffer) >= STREAM_FLUSH_BYTES:
+                        yield bytes(buffer)
+                        buffer.clear()
+    except Exception as e:
+        # Headers are already sent; end the JSON cleanly and flag the failure
+        logger.error(f"Conversation stream error for {phone_clean}: {e}", exc_info=True)
+        buffer += b'],"error":' + orjson.dumps(str(e)) + b'}'
+        yield bytes(buffer)
+        return
+    
+    buffer += b'],' + orjson.dumps({
+        "total": total,
+        "next_cursor": oldest.isoformat() if oldest and total == limit and after is None else None,
+        "newest_cursor": newest.isoformat() if newest else (after.isoformat() if after else None),
+        "message_types": {"sent": sent, "received": received}
+    })[1:]
+    yield bytes(buffer)
+
 @app.get("/get-conversation")
-async def get_conversation_endpoint(phone: str):
-    """Get conversation history for a specific phone number"""
+async def get_conversation_endpoint(
+    phone: str,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[str] = Query(None, description="Cursor: next_cursor from the previous page"),
+    after: Optional[str] = Query(None, description="Cursor: newest_cursor from a previous page, to fetch newer messages")
+):
+    """Get conversation history for a specific phone number, newest page first
+    
+    Messages within a page are oldest-first; pass `next_cursor` as `before` to load older ones,
+    or `newest_cursor` as `after` to load messages that arrived since (oldest of those first).
+    """
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
             await utils.log_api_call("/get-conversation", "GET", phone, 503, "Database not configured")
-            return JSONResponse(
+            return ORJSONResponse(
                 {"status": "error", "messages": [], "error": "Database not configured"},
                 status_code=503
             )
         
         # Normalize phone
-        phone_clean = phone.replace("+", "").replace(" ", "")
-        if not phone_clean.startswith("91"):
-            phone_clean = "91" + phone_clean
+        phone_clean = utils.normalize_phone(phone)
         
         logger.debug(f"Fetching conversation for {phone_clean}")
         
-        headers = utils.get_supabase_headers()
+        # Direct Postgres: stream the page from a server-side cursor
+        if utils.pg_pool is not None:
+            try:
+                before_ts = parse_cursor(before)
+                after_ts = parse_cursor(after)
+            except ValueError:
+                return ORJSONResponse(
+                    {"status": "error", "messages": [], "error": "Invalid 'before'/'after' cursor"},
+                    status_code=400
+                )
+            await utils.log_api_call("/get-conversation", "GET", phone_clean, 200)
+            return StreamingResponse(
+                stream_conversation_page(phone_clean, limit, before_ts, after_ts),
+                media_type="application/json"
+            )
+        
+        # Going forward from `after` reads ascending; otherwise newest page first
+        params = {
+            "phone": f"eq.{phone_clean}",
+            "order": "created_at.asc" if after else "created_at.desc",
+            "limit": limit
+        }
+        if before and after:
+            params["and"] = f"(created_at.gt.{after},created_at.lt.{before})"
+        elif before:
+            params["created_at"] = f"lt.{before}"
+        elif after:
+            params["created_at"] = f"gt.{after}"
         
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/conversations?phone=eq.{phone_clean}&order=created_at.asc",
-            headers=headers,
-            timeout=10
-        )
+        response = await utils.supabase_client.get("/rest/v1/conversations", params=params)
         
         if response.status_code == 200:
-            messages = response.json()
+            messages = orjson.loads(response.content)
+            if not after:
+                messages.reverse()
+            next_cursor = messages[0].get("created_at") if len(messages) == limit and not after else None
+            newest_cursor = messages[-1].get("created_at") if messages else after
             logger.info(f"✓ Retrieved {len(messages)} messages for {phone_clean}")
             await utils.log_api_call("/get-conversation", "GET", phone_clean, 200)
             
-            return JSONResponse({
+            # One pass for both counts, no throwaway filtered lists
+            directions = Counter(m.get("direction") for m in messages)
+            
+            return ORJSONResponse({
                 "status": "success",
                 "phone": phone_clean,
                 "messages": messages,
                 "total": len(messages),
+                "next_cursor": next_cursor,
+                "newest_cursor": newest_cursor,
                 "message_types": {
-                    "sent": len([m for m in messages if m.get("direction") == "outbound"]),
-                    "received": len([m for m in messages if m.get("direction") == "inbound"])
+                    "sent": directions["outbound"],
+                    "received": directions["inbound"]
                 }
             })
         else:
             logger.error(f"Failed to get conversations: {response.status_code} - {response.text}")
             await utils.log_api_call("/get-conversation", "GET", phone_clean, response.status_code, response.text)
-            return JSONResponse(
+            return ORJSONResponse(
                 {"status": "error", "messages": [], "total": 0, "phone": phone_clean, "error": response.text},
                 status_code=response.status_code
             )
@@ -1066,7 +1370,7 @@ async def get_conversation_endpoint(phone: str):
     except Exception as e:
         logger.error(f"Get conversation error: {e}", exc_info=True)
         await utils.log_api_call("/get-conversation", "GET", phone, 500, str(e))
-        return JSONResponse(
+        return ORJSONResponse(
             {"status": "error", "messages": [], "error": str(e)},
             status_code=500
         )
@@ -1074,13 +1378,15 @@ async def get_conversation_endpoint(phone: str):
 @app.get("/recent-messages")
 async def recent_messages(
     phone: Optional[str] = None,
-    limit: int = Query(20, ge=1, le=100)
+    limit: int = Query(20, ge=1, le=100),
+    include_rows: bool = Query(True, description="Set false to get only the counts/status breakdown")
 ):
     """Get recent sent/received messages with live status from Supabase
     
     Parameters:
     - phone: Optional phone number to filter by (e.g., 9876543210 or 919876543210)
     - limit: Number of recent messages to return (1-100, default 20)
+    - include_rows: false returns only the counts, aggregated in Postgres
     
     Returns all recent messages if phone not provided
     Returns messages for specific phone number if phone is provided
@@ -1090,86 +1396,128 @@ async def recent_messages(
         if not SUPABASE_URL or not SUPABASE_KEY:
             # Fallback to in-memory if database not configured
             logger.warning("Supabase not configured, using in-memory storage")
-            messages = get_recent_messages(phone, limit)
-            sent = [m for m in messages if m.get("direction") == "sent"]
-            received = [m for m in messages if m.get("direction") == "received"]
+            messages = await get_recent_messages(phone, limit)
+            sent = sum(1 for m in messages if m["direction"] == "sent")
             
             await utils.log_api_call("/recent-messages", "GET", phone, 200)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "phone": phone or "all",
                 "source": "in-memory",
                 "messages": messages,
                 "total": len(messages),
-                "sent": len(sent),
-                "received": len(received)
+                "sent": sent,
+                "received": len(messages) - sent
             })
         
-        headers = get_supabase_headers()
+        cache_key = ("/recent-messages", phone, limit, include_rows)
+        cached = utils.response_cache.get(cache_key)
+        if cached is not None:
+            await utils.log_api_call("/recent-messages", "GET", cached["phone"], 200)
+            return ORJSONResponse(cached)
+        
         phone_clean = "all"
+        params = {"select": "*", "order": "created_at.desc", "limit": limit}
         
         # Build query - normalize phone if provided
         if phone:
-            phone_clean = phone.replace("+", "").replace(" ", "")
-            if not phone_clean.startswith("91"):
-                phone_clean = "91" + phone_clean
+            phone_clean = utils.normalize_phone(phone)
             # Query with phone filter
-            url = f"{SUPABASE_URL}/rest/v1/messages?phone=eq.{phone_clean}&select=*&order=created_at.desc&limit={limit}"
+            params["phone"] = f"eq.{phone_clean}"
             logger.info(f"Querying Supabase for messages from phone: {phone_clean}")
         else:
             # Query all messages
-            url = f"{SUPABASE_URL}/rest/v1/messages?select=*&order=created_at.desc&limit={limit}"
             logger.info(f"Querying Supabase for all recent messages (limit: {limit})")
         
-        logger.debug(f"Supabase REST endpoint: {url[:100]}...")
-        response = requests.get(url, headers=headers, timeout=15)
+        # Counts only: group in Postgres instead of shipping the rows (falls through if the RPC is missing)
+        if not include_rows:
+            groups = await utils.get_message_breakdown(phone_clean if phone else None, limit)
+            if groups is not None:
+                total = sent = received = 0
+                status_breakdown = {}
+                for group in groups:
+                    n = group["n"]
+                    total += n
+                    if group.get("direction") == "outbound":
+                        sent += n
+                    elif group.get("direction") == "inbound":
+                        received += n
+                    status = group.get("status") or "unknown"
+                    status_breakdown[status] = status_breakdown.get(status, 0) + n
+                
+                body = {
+                    "status": "success",
+                    "phone": phone_clean,
+                    "source": "supabase",
+                    "messages": [],
+                    "total": total,
+                    "sent": sent,
+                    "received": received,
+                    "status_breakdown": status_breakdown,
+                    "last_update": utils.now_iso()
+                }
+                utils.response_cache.set(cache_key, body, ttl=5)
+                await utils.log_api_call("/recent-messages", "GET", phone_clean, 200)
+                return ORJSONResponse(body)
         
-        if response.status_code == 200:
-            messages = response.json()
+        if utils.pg_pool is not None:
+            messages = await utils.get_recent_message_rows(phone_clean if phone else None, limit)
+            status_code = 200
+        else:
+            response = await utils.supabase_client.get("/rest/v1/messages", params=params, timeout=15)
+            status_code = response.status_code
+            messages = orjson.loads(response.content) if status_code == 200 else []
             if not isinstance(messages, list):
                 messages = []
+        
+        if status_code == 200:
             
             logger.info(f"✓ Retrieved {len(messages)} recent messages for {phone_clean}")
             
-            # Count by direction
-            sent = [m for m in messages if m.get("direction") == "outbound"]
-            received = [m for m in messages if m.get("direction") == "inbound"]
-            
-            # Count by status (for live tracking)
+            # Count by direction and by status (for live tracking) in one pass
+            sent = received = 0
             status_breakdown = {}
             for msg in messages:
-                status = msg.get("status", "unknown")
+                direction = msg.get("direction")
+                if direction == "outbound":
+                    sent += 1
+                elif direction == "inbound":
+                    received += 1
+                status = msg.get("status") or "unknown"  # orjson needs str keys
                 status_breakdown[status] = status_breakdown.get(status, 0) + 1
             
-            await utils.log_api_call("/recent-messages", "GET", phone_clean, 200)
-            
-            return JSONResponse({
+            body = {
                 "status": "success",
                 "phone": phone_clean,
                 "source": "supabase",
-                "messages": messages,
+                "messages": messages if include_rows else [],
                 "total": len(messages),
-                "sent": len(sent),
-                "received": len(received),
+                "sent": sent,
+                "received": received,
                 "status_breakdown": status_breakdown,
                 "live_status": "Check individual messages for live status: sent, delivered, seen, read, failed",
-                "last_update": datetime.now().isoformat()
-            })
-        elif response.status_code == 401:
+                "last_update": utils.now_iso()
+            }
+            utils.response_cache.set(cache_key, body, ttl=5)
+            
+            await utils.log_api_call("/recent-messages", "GET", phone_clean, 200)
+            
+            return ORJSONResponse(body)
+        elif status_code == 401:
             logger.error("Supabase authentication failed - Invalid API key")
             await utils.log_api_call("/recent-messages", "GET", phone_clean, 401, "Invalid Supabase key")
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "messages": [],
                 "total": 0,
                 "error": "Supabase authentication failed - Check your SUPABASE_KEY",
                 "code": "AUTH_FAILED"
             }, status_code=401)
-        elif response.status_code == 404:
+        elif status_code == 404:
             logger.info(f"No messages found for {phone_clean}")
             await utils.log_api_call("/recent-messages", "GET", phone_clean, 200)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "phone": phone_clean,
                 "source": "supabase",
@@ -1184,7 +1532,7 @@ async def recent_messages(
             logger.error(f"Supabase query failed: {response.status_code} - {response.text[:200]}")
             await utils.log_api_call("/recent-messages", "GET", phone_clean, response.status_code, response.text[:100])
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "messages": [],
                 "total": 0,
@@ -1192,10 +1540,10 @@ async def recent_messages(
                 "details": response.text[:300] if response.text else "Unknown error"
             }, status_code=response.status_code)
     
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error(f"Recent messages query timed out")
         await utils.log_api_call("/recent-messages", "GET", phone, 504, "Query timeout")
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "messages": [],
             "error": "Query timed out - Supabase is taking too long to respond",
@@ -1205,13 +1553,16 @@ async def recent_messages(
     except Exception as e:
         logger.error(f"Recent messages error: {e}", exc_info=True)
         await utils.log_api_call("/recent-messages", "GET", phone, 500, str(e)[:100])
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "messages": [],
             "error": f"Failed to retrieve messages: {str(e)[:100]}",
             "code": "INTERNAL_ERROR"
         }, status_code=500)
 
+# Rows come back from PostgREST already in the response shape
+RECEIVED_MESSAGE_COLUMNS = "id,phone,sender,message,timestamp:created_at,status,lead_id"
+
 @app.get("/received-messages")
 async def received_messages(
     phone: Optional[str] = None,
@@ -1225,62 +1576,45 @@ async def received_messages(
     try:
         # Get from Supabase conversations table
         if not SUPABASE_URL or not SUPABASE_KEY:
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "messages": [],
                 "total": 0,
                 "note": "Database not configured - showing in-memory messages"
             })
         
-        headers = get_supabase_headers()
-        
-        # Build query - get inbound messages only
-        query = f"{SUPABASE_URL}/rest/v1/conversations?direction=eq.inbound&select=*"
+        # Build query - get inbound messages only, projected (and created_at aliased) to the response shape
+        params = {
+            "direction": "eq.inbound",
+            "select": RECEIVED_MESSAGE_COLUMNS,
+            "order": "created_at.desc",
+            "limit": limit
+        }
         
+        # Normalize like every other endpoint so the filter matches stored numbers
         if phone:
-            query += f"&phone=eq.{phone}"
+            phone = utils.normalize_phone(phone)
+            params["phone"] = f"eq.{phone}"
         
-        query += "&order=created_at.desc"
-        
-        response = requests.get(
-            query,
-            headers=headers,
-            timeout=10
-        )
+        response = await utils.supabase_client.get("/rest/v1/conversations", params=params)
         
         if response.status_code == 200:
-            messages = response.json()
-            
-            # Limit results
-            messages = messages[:limit]
-            
-            # Format for display
-            formatted_messages = []
-            for msg in messages:
-                formatted_messages.append({
-                    "id": msg.get("id"),
-                    "phone": msg.get("phone"),
-                    "sender": msg.get("sender"),
-                    "message": msg.get("message"),
-                    "timestamp": msg.get("created_at"),
-                    "status": msg.get("status"),
-                    "lead_id": msg.get("lead_id")
-                })
+            messages = orjson.loads(response.content)
             
             await utils.log_api_call("/received-messages", "GET", phone, 200)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message": "Received messages from customer",
                 "phone_filter": phone or "all",
-                "messages": formatted_messages,
-                "total_received": len(formatted_messages),
+                "messages": messages,
+                "total_received": len(messages),
                 "limit_applied": limit,
-                "last_update": datetime.now().isoformat()
+                "last_update": utils.now_iso()
             })
         else:
             logger.warning(f"Failed to fetch received messages: {response.status_code} - {response.text}")
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "messages": [],
                 "total": 0,
@@ -1290,7 +1624,7 @@ async def received_messages(
     except Exception as e:
         logger.error(f"Received messages error: {e}", exc_info=True)
         await utils.log_api_call("/received-messages", "GET", phone, 500, str(e))
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "error": str(e),
             "messages": []
@@ -1298,6 +1632,12 @@ async def received_messages(
 
 # ============ TEMPLATE ENDPOINTS ============
 
+# {{name}} placeholders in message_templates.content
+_TEMPLATE_VAR_RE = re.compile(r"\{\{(.+?)\}\}")
+
+# {{1}}, {{2}} positional variables in Meta template bodies
+_POSITIONAL_VAR_RE = re.compile(r"\{\{(\d+)\}\}")
+
 @app.post("/template/create")
 async def template_create(request: TemplateCreate):
     """Create WhatsApp message template using Gemini (backward compatible endpoint)
@@ -1309,7 +1649,7 @@ async def template_create(request: TemplateCreate):
         if not WABA_ID or not ACCESS_TOKEN:
             logger.error("WhatsApp not fully configured")
             await utils.log_api_call("/template/create", "POST", None, 503, "WhatsApp not configured")
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "WhatsApp not configured", "required": ["WABA_ID", "ACCESS_TOKEN"]},
                 status_code=503
             )
@@ -1317,7 +1657,7 @@ async def template_create(request: TemplateCreate):
         # Validate and clean template name
         template_name = request.name.replace(" ", "_").lower()
         if not all(c.isalnum() or c == "_" for c in template_name):
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "Invalid template name. Use only alphanumeric characters and underscores"},
                 status_code=400
             )
@@ -1335,9 +1675,7 @@ async def template_create(request: TemplateCreate):
             if SERVICE_STATUS.get("gemini", False) and GEMINI_API_KEY:
                 try:
                     logger.info(f"Generating template with Gemini from prompt: {request.prompt[:100]}...")
-                    import google.generativeai as genai
-                    genai.configure(api_key=GEMINI_API_KEY)
-                    model = genai.GenerativeModel("gemini-2.5-pro")
+                    model = utils.get_gemini_model()
                     
                     gemini_prompt = f"""Create a professional WhatsApp Business message template.
 
@@ -1355,7 +1693,7 @@ User Idea:
 
 Return ONLY the final template message text, nothing else."""
                     
-                    response = model.generate_content(gemini_prompt)
+                    response = await asyncio.to_thread(model.generate_content, gemini_prompt)
                     if response.text:
                         generated_content = response.text.strip()
                         logger.info(f"✓ Template generated by Gemini: {len(generated_content)} chars")
@@ -1371,7 +1709,7 @@ Return ONLY the final template message text, nothing else."""
             error_msg = "Could not generate template content."
             if request.mode == TemplateModeEnum.AI:
                 error_msg = "Could not generate template. Gemini service may not be available."
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "error": error_msg,
                 "troubleshooting": [
@@ -1390,9 +1728,7 @@ Return ONLY the final template message text, nothing else."""
         
         # Check if text has variables ({{1}}, {{2}}, etc.) and add examples if needed
         # Meta requires examples for any text with variables
-        import re
-        variable_pattern = r'\{\{(\d+)\}\}'
-        variables = re.findall(variable_pattern, generated_content)
+        variables = _POSITIONAL_VAR_RE.findall(generated_content)
         
         if variables:
             # Has positional parameters - need to provide examples
@@ -1413,7 +1749,7 @@ Return ONLY the final template message text, nothing else."""
         if category_str not in valid_categories:
             logger.error(f"Invalid category: {category_str}. Valid: {valid_categories}")
             await utils.log_api_call("/template/create", "POST", None, 400, f"Invalid category: {category_str}")
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "error": f"Invalid category. Must be: UTILITY, MARKETING, or AUTHENTICATION. Got: {category_str}"
             }, status_code=400)
@@ -1434,7 +1770,6 @@ Return ONLY the final template message text, nothing else."""
             # Step 4: Store in Supabase for tracking (correct column names)
             if SUPABASE_URL and SUPABASE_KEY:
                 try:
-                    headers = get_supabase_headers()
                     template_data = {
                         "template_name": template_name,
                         "body": generated_content,
@@ -1446,14 +1781,14 @@ Return ONLY the final template message text, nothing else."""
                         "status": "PENDING_REVIEW"
                     }
                     
-                    store_response = requests.post(
-                        f"{SUPABASE_URL}/rest/v1/templates",
-                        headers={**headers, "Prefer": "return=representation"},
-                        json=template_data,
-                        timeout=10
+                    store_response = await utils.supabase_client.post(
+                        "/rest/v1/templates",
+                        headers=utils.PREFER_REPRESENTATION,
+                        json=template_data
                     )
                     
                     if store_response.status_code in [200, 201]:
+                        utils.template_cache.clear()
                         logger.info(f"✓ Template {template_name} stored in Supabase with ID {template_id}")
                     else:
                         logger.warning(f"Could not store in Supabase: {store_response.status_code} - {store_response.text[:200]}")
@@ -1463,7 +1798,7 @@ Return ONLY the final template message text, nothing else."""
             
             await utils.log_api_call("/template/create", "POST", None, 201)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message": "Template created and sent to WhatsApp for review",
                 "template_name": template_name,
@@ -1474,7 +1809,7 @@ Return ONLY the final template message text, nothing else."""
                 "category": category_str,
                 "approval_status": "PENDING_REVIEW",
                 "next_step": "WhatsApp will review this template within 24 hours. Check status using GET /templates/status",
-                "created_at": datetime.now().isoformat()
+                "created_at": utils.now_iso()
             }, status_code=201)
         else:
             error_details = result.get("details", result.get("error", "Unknown error"))
@@ -1487,7 +1822,7 @@ Return ONLY the final template message text, nothing else."""
             if error_subcode == 2388024:
                 # Template name already exists
                 await utils.log_api_call("/template/create", "POST", None, 409, error_details)
-                return JSONResponse({
+                return ORJSONResponse({
                     "status": "error",
                     "error": "Template name already exists",
                     "error_code": "TEMPLATE_ALREADY_EXISTS",
@@ -1503,7 +1838,7 @@ Return ONLY the final template message text, nothing else."""
             else:
                 # Other errors
                 await utils.log_api_call("/template/create", "POST", None, 500, error_details)
-                return JSONResponse({
+                return ORJSONResponse({
                     "status": "error",
                     "error": "Failed to create template on WhatsApp",
                     "details": error_details,
@@ -1518,7 +1853,7 @@ Return ONLY the final template message text, nothing else."""
     except Exception as e:
         logger.error(f"Template create error: {e}", exc_info=True)
         await utils.log_api_call("/template/create", "POST", None, 500, str(e))
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "error": str(e)
         }, status_code=500)
@@ -1539,7 +1874,7 @@ async def create_template_on_meta(request: TemplateCreate):
         if not WABA_ID or not ACCESS_TOKEN:
             logger.error("WhatsApp not fully configured")
             await utils.log_api_call("/create-template", "POST", None, 503, "WhatsApp not configured")
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "WhatsApp not configured", "required": ["WABA_ID", "ACCESS_TOKEN"]},
                 status_code=503
             )
@@ -1547,7 +1882,7 @@ async def create_template_on_meta(request: TemplateCreate):
         # Validate and clean template name
         template_name = request.name.replace(" ", "_").lower()
         if not all(c.isalnum() or c == "_" for c in template_name):
-            return JSONResponse(
+            return ORJSONResponse(
                 {"error": "Invalid template name. Use only alphanumeric characters and underscores"},
                 status_code=400
             )
@@ -1565,9 +1900,7 @@ async def create_template_on_meta(request: TemplateCreate):
             if SERVICE_STATUS.get("gemini", False) and GEMINI_API_KEY:
                 try:
                     logger.info(f"Generating template with Gemini from prompt: {request.prompt[:100]}...")
-                    import google.generativeai as genai
-                    genai.configure(api_key=GEMINI_API_KEY)
-                    model = genai.GenerativeModel("gemini-2.5-pro")
+                    model = utils.get_gemini_model()
                     
                     gemini_prompt = f"""Create a professional WhatsApp Business message template.
 
@@ -1585,7 +1918,7 @@ User Idea:
 
 Return ONLY the final template message text, nothing else."""
                     
-                    response = model.generate_content(gemini_prompt)
+                    response = await asyncio.to_thread(model.generate_content, gemini_prompt)
                     if response.text:
                         generated_content = response.text.strip()
                         logger.info(f"✓ Template generated by Gemini: {len(generated_content)} chars")
@@ -1601,7 +1934,7 @@ Return ONLY the final template message text, nothing else."""
             error_msg = "Could not generate template content."
             if request.mode == TemplateModeEnum.AI:
                 error_msg = "Could not generate template. Gemini service may not be available."
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "error": error_msg,
                 "troubleshooting": [
@@ -1618,9 +1951,7 @@ Return ONLY the final template message text, nothing else."""
         }
         
         # Auto-detect variables and add required example field
-        import re
-        variable_pattern = r'\{\{(\d+)\}\}'
-        variables = re.findall(variable_pattern, generated_content)
+        variables = _POSITIONAL_VAR_RE.findall(generated_content)
         if variables:
             example_values = [f"example_value_{i}" for i in range(1, len(variables) + 1)]
             component["example"] = {"body_text": [example_values]}
@@ -1635,7 +1966,7 @@ Return ONLY the final template message text, nothing else."""
         if category_str not in valid_categories:
             logger.error(f"Invalid category: {category_str}. Valid: {valid_categories}")
             await utils.log_api_call("/create-template", "POST", None, 400, f"Invalid category: {category_str}")
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "error": f"Invalid category. Must be: UTILITY, MARKETING, or AUTHENTICATION. Got: {category_str}"
             }, status_code=400)
@@ -1656,7 +1987,6 @@ Return ONLY the final template message text, nothing else."""
             # Step 4: Store in Supabase for tracking (correct column names)
             if SUPABASE_URL and SUPABASE_KEY:
                 try:
-                    headers = get_supabase_headers()
                     template_data = {
                         "template_name": template_name,
                         "body": generated_content,
@@ -1668,14 +1998,14 @@ Return ONLY the final template message text, nothing else."""
                         "status": "PENDING_REVIEW"
                     }
                     
-                    store_response = requests.post(
-                        f"{SUPABASE_URL}/rest/v1/templates",
-                        headers={**headers, "Prefer": "return=representation"},
-                        json=template_data,
-                        timeout=10
+                    store_response = await utils.supabase_client.post(
+                        "/rest/v1/templates",
+                        headers=utils.PREFER_REPRESENTATION,
+                        json=template_data
                     )
                     
                     if store_response.status_code in [200, 201]:
+                        utils.template_cache.clear()
                         logger.info(f"✓ Template {template_name} stored in Supabase with ID {template_id}")
                     else:
                         logger.warning(f"Could not store in Supabase: {store_response.status_code} - {store_response.text[:200]}")
@@ -1685,7 +2015,7 @@ Return ONLY the final template message text, nothing else."""
             
             await utils.log_api_call("/create-template", "POST", None, 201)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message": "Template created and sent to WhatsApp for review",
                 "template_name": template_name,
@@ -1696,7 +2026,7 @@ Return ONLY the final template message text, nothing else."""
                 "category": category_str,
                 "approval_status": "PENDING_REVIEW",
                 "next_step": "WhatsApp will review this template within 24 hours. Check status using GET /templates/status",
-                "created_at": datetime.now().isoformat()
+                "created_at": utils.now_iso()
             }, status_code=201)
         else:
             error_details = result.get("details", result.get("error", "Unknown error"))
@@ -1709,7 +2039,7 @@ Return ONLY the final template message text, nothing else."""
             if error_subcode == 2388024:
                 # Template name already exists
                 await utils.log_api_call("/create-template", "POST", None, 409, error_details)
-                return JSONResponse({
+                return ORJSONResponse({
                     "status": "error",
                     "error": "Template name already exists",
                     "error_code": "TEMPLATE_ALREADY_EXISTS",
@@ -1725,7 +2055,7 @@ Return ONLY the final template message text, nothing else."""
             else:
                 # Other errors
                 await utils.log_api_call("/create-template", "POST", None, 500, error_details)
-                return JSONResponse({
+                return ORJSONResponse({
                     "status": "error",
                     "error": "Failed to create template on WhatsApp",
                     "details": error_details,
@@ -1740,7 +2070,7 @@ Return ONLY the final template message text, nothing else."""
     except Exception as e:
         logger.error(f"Create template error: {e}", exc_info=True)
         await utils.log_api_call("/create-template", "POST", None, 500, str(e))
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "error": str(e)
         }, status_code=500)
@@ -1750,22 +2080,22 @@ async def templates_list():
     """Get all active message templates with Gemini enhancement info"""
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
-            return JSONResponse({"templates": [], "count": 0})
-        
-        headers = utils.get_supabase_headers()
+            return ORJSONResponse({"templates": [], "count": 0})
         
-        # Filter by active status using message_templates table
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/message_templates?is_active=eq.true&select=*&order=created_at.desc",
-            headers=headers,
-            timeout=10
-        )
+        templates = utils.template_cache.get("active")
+        if templates is None:
+            # Filter by active status using message_templates table
+            response = await utils.supabase_client.get(
+                "/rest/v1/message_templates?is_active=eq.true&select=*&order=created_at.desc"
+            )
+            if response.status_code == 200:
+                templates = orjson.loads(response.content)
+                utils.template_cache.set("active", templates, ttl=utils.TEMPLATE_CACHE_TTL)
         
-        if response.status_code == 200:
-            templates = response.json()
+        if templates is not None:
             await utils.log_api_call("/templates", "GET", None, 200)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "templates": templates,
                 "count": len(templates),
@@ -1773,11 +2103,11 @@ async def templates_list():
             })
         else:
             logger.warning(f"Could not fetch templates: {response.status_code} - {response.text}")
-            return JSONResponse({"templates": [], "count": 0, "status": "database_error"})
+            return ORJSONResponse({"templates": [], "count": 0, "status": "database_error"})
     
     except Exception as e:
         logger.error(f"Templates list error: {e}")
-        return JSONResponse({"templates": [], "count": 0, "error": str(e)})
+        return ORJSONResponse({"templates": [], "count": 0, "error": str(e)})
 
 @app.get("/templates/status")
 async def templates_status():
@@ -1788,28 +2118,25 @@ async def templates_status():
     """
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "error": "Database not configured"
             }, status_code=503)
         
-        headers = get_supabase_headers()
-        
         # Get all templates from Supabase
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/templates?select=status,template_name,created_at,category",
-            headers=headers,
-            timeout=10
+        response = await utils.supabase_client.get(
+            "/rest/v1/templates",
+            params={"select": "status,template_name,created_at,category"}
         )
         
         if response.status_code != 200:
             logger.error(f"Failed to fetch templates: {response.status_code} - {response.text}")
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "error": "Failed to fetch templates from database"
             }, status_code=500)
         
-        templates = response.json()
+        templates = orjson.loads(response.content)
         
         # Aggregate by status
         status_counts = {}
@@ -1817,8 +2144,8 @@ async def templates_status():
         templates_by_status = {}
         
         for template in templates:
-            status = template.get("status", "UNKNOWN")
-            category = template.get("category", "UNKNOWN")
+            status = template.get("status") or "UNKNOWN"
+            category = template.get("category") or "UNKNOWN"
             
             # Count by status
             status_counts[status] = status_counts.get(status, 0) + 1
@@ -1837,7 +2164,7 @@ async def templates_status():
         
         await utils.log_api_call("/templates/status", "GET", None, 200)
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "success",
             "total_templates": len(templates),
             "status_breakdown": status_counts,
@@ -1846,13 +2173,13 @@ async def templates_status():
             "pending": status_counts.get("PENDING", 0) + status_counts.get("PENDING_REVIEW", 0),
             "rejected": status_counts.get("REJECTED", 0),
             "templates_by_status": templates_by_status,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": utils.now_iso()
         })
     
     except Exception as e:
         logger.error(f"Templates status error: {e}", exc_info=True)
         await utils.log_api_call("/templates/status", "GET", None, 500, str(e))
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "error": str(e)
         }, status_code=500)
@@ -1862,29 +2189,32 @@ async def template_send(request: TemplateSend):
     """Send message from template"""
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
-            return JSONResponse({"error": "Database not configured"}, status_code=503)
-        
-        headers = utils.get_supabase_headers()
-        
-        # Get template from message_templates table
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/message_templates?id=eq.{request.template_id}",
-            headers=headers,
-            timeout=10
-        )
-        
-        if response.status_code != 200 or not response.json():
-            return JSONResponse({"error": "Template not found in database"}, status_code=404)
-        
-        template = response.json()[0]
+            return ORJSONResponse({"error": "Database not configured"}, status_code=503)
+        
+        cache_key = ("id", request.template_id)
+        template = utils.template_cache.get(cache_key)
+        if template is None:
+            # Get template from message_templates table
+            response = await utils.supabase_client.get(
+                f"/rest/v1/message_templates?id=eq.{request.template_id}"
+            )
+            
+            rows = orjson.loads(response.content) if response.status_code == 200 else []
+            if not rows:
+                return ORJSONResponse({"error": "Template not found in database"}, status_code=404)
+            
+            template = rows[0]
+            utils.template_cache.set(cache_key, template, ttl=utils.TEMPLATE_CACHE_TTL)
         
         # Replace variables in template content
-        message = template["content"]
-        for key, value in request.variables.items():
-            message = message.replace(f"{{{{{key}}}}}", str(value))
+        variables = request.variables
+        message = _TEMPLATE_VAR_RE.sub(
+            lambda m: str(variables[m.group(1)]) if m.group(1) in variables else m.group(0),
+            template["content"]
+        )
         
         # Send message
-        success, msg_id = utils.send_whatsapp_message(
+        success, msg_id = await utils.send_whatsapp_message(
             PHONE_NUMBER_ID,
             ACCESS_TOKEN,
             request.phone,
@@ -1894,11 +2224,11 @@ async def template_send(request: TemplateSend):
         if success:
             # If no message_id from API, generate UUID for tracking
             if not msg_id:
-                msg_id = str(uuid.uuid4())
+                msg_id = secrets.token_hex(16)
                 logger.debug(f"Generated UUID for template message: {msg_id}")
             
             # Store in memory
-            utils.add_to_recent_messages(message, "Template", request.phone, "sent")
+            await utils.add_to_recent_messages(message, "Template", request.phone, "sent")
             
             # Store message and conversation together
             db_success, db_data = await utils.store_conversation_with_message(
@@ -1918,21 +2248,21 @@ async def template_send(request: TemplateSend):
             else:
                 logger.warning(f"Template sent but storage failed for {request.phone}")
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message_id": msg_id,
                 "message": message,
                 "template_id": request.template_id,
                 "stored_in_supabase": db_success,
-                "sent_at": datetime.now().isoformat()
+                "sent_at": utils.now_iso()
             })
         else:
-            return JSONResponse({"error": "Failed to send template"}, status_code=500)
+            return ORJSONResponse({"error": "Failed to send template"}, status_code=500)
     
     except Exception as e:
         logger.error(f"Template send error: {e}")
         await utils.log_api_call("/template/send", "POST", request.phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 # ============ LEAD ENDPOINTS ============
 
@@ -1945,48 +2275,44 @@ async def create_lead(request: LeadCreate):
         if success:
             await utils.log_api_call("/leads/create", "POST", request.phone, 201)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "lead": lead
             }, status_code=201)
         else:
-            return JSONResponse({"error": "Failed to create lead"}, status_code=500)
+            return ORJSONResponse({"error": "Failed to create lead"}, status_code=500)
     
     except Exception as e:
         logger.error(f"Create lead error: {e}")
         await utils.log_api_call("/leads/create", "POST", request.phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.get("/leads")
 async def list_leads(limit: int = Query(100, ge=1, le=1000)):
     """List all leads"""
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
-            return JSONResponse({"leads": [], "count": 0})
-        
-        headers = get_supabase_headers()
+            return ORJSONResponse({"leads": [], "count": 0})
         
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/leads?limit={limit}&order=created_at.desc",
-            headers=headers,
-            timeout=10
+        response = await utils.supabase_client.get(
+            f"/rest/v1/leads?limit={limit}&order=created_at.desc"
         )
         
         if response.status_code == 200:
-            leads = response.json()
+            leads = orjson.loads(response.content)
             await utils.log_api_call("/leads", "GET", None, 200)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "leads": leads,
                 "count": len(leads)
             })
         else:
-            return JSONResponse({"leads": [], "count": 0})
+            return ORJSONResponse({"leads": [], "count": 0})
     
     except Exception as e:
         logger.error(f"List leads error: {e}")
-        return JSONResponse({"leads": [], "count": 0})
+        return ORJSONResponse({"leads": [], "count": 0})
 
 @app.post("/leads/status")
 async def update_lead_status(
@@ -1997,25 +2323,23 @@ async def update_lead_status(
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
             await utils.log_api_call("/leads/status", "POST", phone, 503, "Database not configured")
-            return JSONResponse({"error": "Database not configured"}, status_code=503)
+            return ORJSONResponse({"error": "Database not configured"}, status_code=503)
         
-        headers = utils.get_supabase_headers()
+        phone_clean = utils.normalize_phone(phone)
+        logger.debug(f"Updating lead status for {phone_clean} to {status}")
+        utils.lead_cache.pop(phone_clean)
         
-        logger.debug(f"Updating lead status for {phone} to {status}")
-        
-        response = requests.patch(
-            f"{SUPABASE_URL}/rest/v1/leads?phone=eq.{phone}",
-            headers=headers,
-            json={"status": status, "updated_at": datetime.now().isoformat()},
-            timeout=10
+        response = await utils.supabase_client.patch(
+            f"/rest/v1/leads?phone=eq.{phone_clean}",
+            json={"status": status, "updated_at": utils.utc_now_iso()}
         )
         
         logger.debug(f"Update response: {response.status_code} - {response.text}")
         
-        if response.status_code == 200:
+        if response.status_code in (200, 204):
             await utils.log_api_call("/leads/status", "POST", phone, 200)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message": f"Lead status updated to {status}",
                 "phone": phone,
@@ -2024,12 +2348,12 @@ async def update_lead_status(
         else:
             logger.error(f"Supabase error: {response.status_code} - {response.text}")
             await utils.log_api_call("/leads/status", "POST", phone, response.status_code, response.text)
-            return JSONResponse({"error": f"Failed to update status: {response.text}"}, status_code=500)
+            return ORJSONResponse({"error": f"Failed to update status: {response.text}"}, status_code=500)
     
     except Exception as e:
         logger.error(f"Update status error: {e}", exc_info=True)
         await utils.log_api_call("/leads/status", "POST", phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 # ============ ADMIN MANAGEMENT ENDPOINTS ============
 
@@ -2041,14 +2365,14 @@ async def create_admin(request: models.AdminCreate):
         
         if success and admin:
             await utils.log_api_call("/admin/create", "POST", None, 201)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message": "Admin created successfully",
                 "admin": admin
             }, status_code=201)
         else:
             await utils.log_api_call("/admin/create", "POST", None, 500)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "message": "Failed to create admin"
             }, status_code=500)
@@ -2056,7 +2380,7 @@ async def create_admin(request: models.AdminCreate):
     except Exception as e:
         logger.error(f"Create admin error: {e}")
         await utils.log_api_call("/admin/create", "POST", None, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.get("/admin/list")
 async def list_admins():
@@ -2066,13 +2390,13 @@ async def list_admins():
         
         if success:
             await utils.log_api_call("/admin/list", "GET", None, 200)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "admins": admins,
                 "count": len(admins)
             })
         else:
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "admins": [],
                 "count": 0
@@ -2081,7 +2405,7 @@ async def list_admins():
     except Exception as e:
         logger.error(f"List admins error: {e}")
         await utils.log_api_call("/admin/list", "GET", None, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 # ============ AGENT MANAGEMENT ENDPOINTS ============
 
@@ -2093,14 +2417,14 @@ async def create_agent(request: models.AgentCreate):
         
         if success and agent:
             await utils.log_api_call("/agent/create", "POST", None, 201)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message": "Agent created successfully",
                 "agent": agent
             }, status_code=201)
         else:
             await utils.log_api_call("/agent/create", "POST", None, 500)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "message": "Failed to create agent"
             }, status_code=500)
@@ -2108,7 +2432,7 @@ async def create_agent(request: models.AgentCreate):
     except Exception as e:
         logger.error(f"Create agent error: {e}")
         await utils.log_api_call("/agent/create", "POST", None, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.get("/agent/list")
 async def list_agents():
@@ -2118,13 +2442,13 @@ async def list_agents():
         
         if success:
             await utils.log_api_call("/agent/list", "GET", None, 200)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "agents": agents,
                 "count": len(agents)
             })
         else:
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "agents": [],
                 "count": 0
@@ -2133,7 +2457,7 @@ async def list_agents():
     except Exception as e:
         logger.error(f"List agents error: {e}")
         await utils.log_api_call("/agent/list", "GET", None, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.post("/agent/send-message")
 async def agent_send_message(request: models.AgentMessageSend):
@@ -2147,7 +2471,7 @@ async def agent_send_message(request: models.AgentMessageSend):
         
         if success:
             await utils.log_api_call("/agent/send-message", "POST", request.lead_phone, 200)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "message": "Message sent successfully",
                 "message_id": msg_id,
@@ -2156,7 +2480,7 @@ async def agent_send_message(request: models.AgentMessageSend):
             })
         else:
             await utils.log_api_call("/agent/send-message", "POST", request.lead_phone, 500)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "message": "Failed to send message"
             }, status_code=500)
@@ -2164,7 +2488,7 @@ async def agent_send_message(request: models.AgentMessageSend):
     except Exception as e:
         logger.error(f"Agent send message error: {e}")
         await utils.log_api_call("/agent/send-message", "POST", request.lead_phone, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.get("/agent/{agent_id}/conversations")
 async def get_agent_conversations(agent_id: str, limit: int = Query(50, ge=1, le=100)):
@@ -2174,13 +2498,13 @@ async def get_agent_conversations(agent_id: str, limit: int = Query(50, ge=1, le
         
         if success:
             await utils.log_api_call(f"/agent/{agent_id}/conversations", "GET", None, 200)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "data": data
             })
         else:
             await utils.log_api_call(f"/agent/{agent_id}/conversations", "GET", None, 404)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "message": "Agent not found or no conversations"
             }, status_code=404)
@@ -2188,7 +2512,7 @@ async def get_agent_conversations(agent_id: str, limit: int = Query(50, ge=1, le
     except Exception as e:
         logger.error(f"Get agent conversations error: {e}")
         await utils.log_api_call(f"/agent/{agent_id}/conversations", "GET", None, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 @app.get("/agent/{agent_id}/recent-conversations")
 async def get_agent_recent_conversations(agent_id: str, limit: int = Query(10, ge=1, le=50)):
@@ -2200,7 +2524,7 @@ async def get_agent_recent_conversations(agent_id: str, limit: int = Query(10, g
             recent_conversations = data.get("recent_conversations", [])
             await utils.log_api_call(f"/agent/{agent_id}/recent-conversations", "GET", None, 200)
             
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "success",
                 "agent_id": agent_id,
                 "agent_name": data.get("agent_name"),
@@ -2209,7 +2533,7 @@ async def get_agent_recent_conversations(agent_id: str, limit: int = Query(10, g
             })
         else:
             await utils.log_api_call(f"/agent/{agent_id}/recent-conversations", "GET", None, 404)
-            return JSONResponse({
+            return ORJSONResponse({
                 "status": "error",
                 "message": "Agent not found or no conversations"
             }, status_code=404)
@@ -2217,43 +2541,7 @@ async def get_agent_recent_conversations(agent_id: str, limit: int = Query(10, g
     except Exception as e:
         logger.error(f"Get agent recent conversations error: {e}")
         await utils.log_api_call(f"/agent/{agent_id}/recent-conversations", "GET", None, 500, str(e))
-        return JSONResponse({"error": str(e)}, status_code=500)
-
-# ============ STARTUP EVENT ============
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize app on startup"""
-    logger.info("=" * 70)
-    logger.info(f"  {APP_TITLE} v{APP_VERSION}")
-    logger.info("=" * 70)
-    logger.info("")
-    logger.info("🔧 Initializing Services:")
-    
-    # Initialize Gemini
-    if GEMINI_API_KEY:
-        try:
-            import google.generativeai as genai
-            genai.configure(api_key=GEMINI_API_KEY)
-            # Test the connection by creating a model instance
-            model = genai.GenerativeModel("gemini-2.5-pro")
-            SERVICE_STATUS["gemini"] = True
-            logger.info("   ✓ Gemini AI: Ready (gemini-2.5-pro)")
-        except Exception as e:
-            logger.error(f"   ✗ Gemini AI: Failed to initialize - {e}")
-            SERVICE_STATUS["gemini"] = False
-    else:
-        logger.warning("   ⚠ Gemini AI: No API key provided - auto-replies disabled")
-        SERVICE_STATUS["gemini"] = False
-    
-    # Log other services
-    logger.info(f"   {'✓' if ACCESS_TOKEN and PHONE_NUMBER_ID else '⚠'} WhatsApp: {'Configured' if ACCESS_TOKEN and PHONE_NUMBER_ID else 'Not Configured'}")
-    logger.info(f"   {'✓' if SUPABASE_URL else '⚠'} Database: {'Connected' if SUPABASE_URL else 'Not Configured'}")
-    logger.info("")
-    logger.info(" API Documentation:")
-    logger.info(f"   Interactive: http://localhost:{PORT}/docs")
-    logger.info(f"   OpenAPI: http://localhost:{PORT}/openapi.json")
-    logger.info("")
+        return ORJSONResponse({"error": str(e)}, status_code=500)
 
 # ============ MAIN ============
 
@@ -440,6 +440,26 @@ class WebhookMessage(BaseModel):
     object: str
     entry: List[Dict[str, Any]]
 
+class WebhookValue(BaseModel):
+    """`value` of a webhook change; message/status items stay plain dicts"""
+    messages: List[Dict[str, Any]] = []
+    statuses: List[Dict[str, Any]] = []
+    message_template_status_update: Optional[Dict[str, Any]] = None
+
+class WebhookChange(BaseModel):
+    """One change inside a webhook entry"""
+    value: WebhookValue
+
+class WebhookEntry(BaseModel):
+    """One entry of a webhook delivery"""
+    time: Optional[int] = None
+    changes: List[WebhookChange] = []
+
+class WebhookPayload(BaseModel):
+    """Typed webhook envelope, parsed and validated in one pass from raw bytes"""
+    object: Optional[str] = None
+    entry: List[WebhookEntry] = []
+
 class WebhookResponse(BaseModel):
     """Standard webhook response"""
     status: str = "success"
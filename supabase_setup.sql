@@ -437,5 +437,29 @@ CREATE POLICY "Enable read access for all users" ON messages
 CREATE POLICY "Enable insert for all users" ON messages
     FOR INSERT WITH CHECK (true);
 
+-- ============ HEALTH CHECK FUNCTIONS ============
+
+-- Inserts a per-call sentinel admin (random email, so it never collides with a real row)
+-- and rolls it back in one call (used by db_setup_helper.py).
+-- Only the deliberate rollback is swallowed; real insert errors still surface.
+CREATE OR REPLACE FUNCTION admin_roundtrip_check() RETURNS boolean AS $$
+BEGIN
+    BEGIN
+        INSERT INTO admins (email, name, password_hash, role, status)
+        VALUES ('probe-' || gen_random_uuid() || '@example.invalid', 'p', 'h', 'admin', 'active');
+        RAISE EXCEPTION 'rollback';
+    EXCEPTION WHEN raise_exception THEN
+        RETURN true;
+    END;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Returns which of the given public tables exist, so all tables are verified in one call
+CREATE OR REPLACE FUNCTION tables_exist(names text[]) RETURNS text[] AS $$
+    SELECT coalesce(array_agg(tablename::text), '{}')
+    FROM pg_tables
+    WHERE schemaname = 'public' AND tablename = ANY(names);
+$$ LANGUAGE sql STABLE;
+
 -- Print summary
 SELECT '✅ Tables created successfully!' as status;
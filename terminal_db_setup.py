@@ -6,8 +6,18 @@ Execute SQL commands directly using Supabase REST API
 
 import requests
 import json
+from requests.adapters import HTTPAdapter
 from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
 
+# Headers are set once on the session so call sites only pass the request
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8))
+_SESSION.headers.update({
+    "apikey": SUPABASE_SERVICE_KEY,
+    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
+    "Content-Type": "application/json"
+})
+
 def execute_sql_command(sql_command: str) -> bool:
     """Execute a single SQL command via Supabase REST API"""
     try:
@@ -15,16 +25,9 @@ def execute_sql_command(sql_command: str) -> bool:
             print("❌ Supabase not configured")
             return False
         
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         # Use Supabase RPC endpoint to execute raw SQL
-        response = requests.post(
+        response = _SESSION.post(
             f"{SUPABASE_URL}/rest/v1/rpc/exec_sql",
-            headers=headers,
             json={"sql": sql_command},
             timeout=30
         )
@@ -166,12 +169,6 @@ def create_table_direct(table_name: str, create_sql: str) -> bool:
         # Clean table name for API
         clean_name = table_name.split()[0].lower()
         
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         # Try to execute the CREATE TABLE command using SQL endpoint
         return execute_sql_via_rest(create_sql)
         
@@ -182,20 +179,13 @@ def create_table_direct(table_name: str, create_sql: str) -> bool:
 def execute_sql_via_rest(sql: str) -> bool:
     """Execute SQL using Supabase REST API with RPC"""
     try:
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         # Clean the SQL command
         clean_sql = sql.strip()
         
         # Call a simple SQL execution function
         # First, let's try using the standard SQL execution method
-        response = requests.post(
+        response = _SESSION.post(
             f"{SUPABASE_URL}/rest/v1/rpc/exec_sql", 
-            headers=headers,
             json={"query": clean_sql},
             timeout=30
         )
@@ -231,15 +221,8 @@ def create_admins_table() -> bool:
     """Create admins table manually"""
     try:
         # Test if table exists by trying to query it
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.get(
+        response = _SESSION.get(
             f"{SUPABASE_URL}/rest/v1/admins?limit=0",
-            headers=headers,
             timeout=10
         )
         
@@ -255,15 +238,8 @@ def create_admins_table() -> bool:
 def create_agents_table() -> bool:
     """Create agents table manually"""
     try:
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.get(
+        response = _SESSION.get(
             f"{SUPABASE_URL}/rest/v1/agents?limit=0",
-            headers=headers,
             timeout=10
         )
         
@@ -279,15 +255,8 @@ def create_agents_table() -> bool:
 def create_templates_table() -> bool:
     """Create message_templates table manually"""
     try:
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.get(
+        response = _SESSION.get(
             f"{SUPABASE_URL}/rest/v1/message_templates?limit=0",
-            headers=headers,
             timeout=10
         )
         
@@ -316,13 +285,9 @@ def main():
         print("\n🎉 SUCCESS! Running verification...")
         
         # Run verification
-        import subprocess
         try:
-            result = subprocess.run(["python", "db_setup_helper.py"], 
-                                  capture_output=True, text=True, timeout=30)
-            print(result.stdout)
-            
-            if "🎉 Database setup is COMPLETE" in result.stdout:
+            from db_setup_helper import main as verify_main
+            if verify_main():
                 print("\n✅ ALL SYSTEMS GO!")
                 print("Your admin/agent endpoints should now work!")
                 return True
@@ -3,31 +3,251 @@ Utility Functions and Helpers with enhanced features
 Real-time database operations with proper error handling
 """
 
-import json
+import asyncio
+import hmac
+import secrets
 import logging
-import requests
-from datetime import datetime
-from typing import List, Dict, Any, Tuple, Optional
-from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_KEY, GEMINI_API_KEY, SERVICE_STATUS, ACCESS_TOKEN, PHONE_NUMBER_ID
+import time
+import httpx
+import orjson
+from collections import deque
+from itertools import islice
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Tuple, Optional, Deque
+from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_KEY, GEMINI_API_KEY, SERVICE_STATUS, ACCESS_TOKEN, PHONE_NUMBER_ID, DATABASE_URL, REDIS_URL
+
+try:
+    import asyncpg
+except ImportError:  # only needed when DATABASE_URL is set
+    asyncpg = None
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed when REDIS_URL is set
+    aioredis = None
 
 logger = logging.getLogger(__name__)
 
+# ============ PHONE NUMBERS ============
+
+# Separators people type into numbers, dropped in one C-level pass
+_PHONE_TRANS = str.maketrans("", "", "+ -()")
+
+def clean_phone(phone: str) -> str:
+    """Strip '+', spaces, dashes and parentheses from a phone number"""
+    return phone.translate(_PHONE_TRANS)
+
+def normalize_phone(phone: str) -> str:
+    """Clean a phone number and prefix the 91 country code if missing"""
+    phone = phone.translate(_PHONE_TRANS)
+    return phone if phone.startswith("91") else "91" + phone
+
 # ============ IN-MEMORY STORAGE ============
 
-recent_messages: List[Dict[str, Any]] = []
 MAX_RECENT_MESSAGES = 100
+MAX_RECENT_PHONES = 1000
+
+# Ring buffers: one across all phones, one per phone, so reads never filter
+recent_messages: Deque[Dict[str, Any]] = deque(maxlen=MAX_RECENT_MESSAGES)
+recent_messages_by_phone: Dict[str, Deque[Dict[str, Any]]] = {}
+
+# ============ RESPONSE CACHE ============
+
+class TTLCache:
+    """Small in-process cache where every entry carries its own expiry"""
+    
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: Dict[Any, Tuple[float, Any]] = {}
+    
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return default
+        return value
+    
+    def set(self, key: Any, value: Any, ttl: float):
+        if key not in self._data and len(self._data) >= self.maxsize:
+            # Evict the oldest entry (dicts keep insertion order)
+            self._data.pop(next(iter(self._data)))
+        self._data[key] = (time.monotonic() + ttl, value)
+    
+    def pop(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else default
+    
+    def clear(self):
+        self._data.clear()
+
+# Cached read-endpoint bodies, dropped whenever message data changes
+response_cache = TTLCache()
+
+# Template rows change rarely; cleared whenever a template is created
+template_cache = TTLCache()
+TEMPLATE_CACHE_TTL = 300
+
+# /message-status bodies by message_id; clients poll these, writes pop the entry
+message_status_cache = TTLCache(maxsize=10_000)
+MESSAGE_STATUS_TTL = 2
+
+# Leads by phone, so a chatty customer costs at most one upsert per minute
+lead_cache = TTLCache(maxsize=10_000)
+LEAD_CACHE_TTL = 60
+
+# Webhook events already handled; Meta retries slow webhooks. Shared through
+# Redis when REDIS_URL is set (all workers), otherwise per process.
+seen_message_ids = TTLCache(maxsize=10_000)
+SEEN_MESSAGE_TTL = 86400
+redis_client = aioredis.from_url(REDIS_URL, max_connections=50) if REDIS_URL and aioredis else None
+
+async def first_time_seen(event_key: Optional[str]) -> bool:
+    """Record a webhook event key; False if it was already processed in the last day"""
+    if not event_key:
+        return True
+    if redis_client is not None:
+        try:
+            # SET NX EX: atomic check-and-record in one round trip
+            return bool(await redis_client.set(f"wh:{event_key}", "1", nx=True, ex=SEEN_MESSAGE_TTL))
+        except Exception as e:
+            logger.warning(f"Redis dedup unavailable, using local cache: {e}")
+    if seen_message_ids.get(event_key) is not None:
+        return False
+    seen_message_ids.set(event_key, True, ttl=SEEN_MESSAGE_TTL)
+    return True
+
+# ============ POSTGRES POOL ============
+
+# Direct asyncpg pool for hot-path writes when DATABASE_URL is configured;
+# everything falls back to PostgREST when it's None
+pg_pool = None
+
+async def open_pg_pool():
+    """Create the asyncpg pool (called from the app lifespan)"""
+    global pg_pool
+    if not DATABASE_URL:
+        return
+    if asyncpg is None:
+        logger.warning("DATABASE_URL is set but asyncpg is not installed - using REST")
+        return
+    try:
+        # statement_cache_size=0: prepared statements don't survive Supavisor transaction mode
+        pg_pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=2,
+            max_size=20,
+            max_inactive_connection_lifetime=300,
+            statement_cache_size=0
+        )
+        logger.info("   ✓ Postgres pool: Connected")
+    except Exception as e:
+        logger.error(f"   ✗ Postgres pool: Failed to connect - {e}")
+        pg_pool = None
+
+async def close_pg_pool():
+    global pg_pool
+    if pg_pool is not None:
+        await pg_pool.close()
+        pg_pool = None
+
+# ============ TIMESTAMPS ============
+
+def utc_now_iso() -> str:
+    """Current UTC time for timestamp columns written by the app (inserts rely on DEFAULT now())"""
+    return datetime.now(timezone.utc).isoformat()
+
+# Local-time ISO string, re-formatted at most once per second
+_now_iso_cache = ["", -1]
+
+def now_iso() -> str:
+    """Current local time as ISO string at one-second resolution (for response/log timestamps)"""
+    second = int(time.time())
+    if second != _now_iso_cache[1]:
+        _now_iso_cache[0] = datetime.fromtimestamp(second).isoformat()
+        _now_iso_cache[1] = second
+    return _now_iso_cache[0]
+
+# ============ HTTP CLIENT ============
+
+# Shared keep-alive pool for outbound WhatsApp Graph API calls
+http_client = httpx.AsyncClient(
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=100, keepalive_expiry=30)
+)
+
+# Graph API endpoint and headers for the configured number, built once
+GRAPH_API_VERSION = "v19.0"
+GRAPH_MESSAGES_URL = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{PHONE_NUMBER_ID}/messages"
+GRAPH_HEADERS = {
+    "Authorization": f"Bearer {ACCESS_TOKEN}",
+    "Content-Type": "application/json"
+}
+
+def graph_messages_target(phone_number_id: str, access_token: str) -> Tuple[str, Dict[str, str]]:
+    """URL and headers for the /messages endpoint (prebuilt for the configured number)"""
+    if phone_number_id == PHONE_NUMBER_ID and access_token == ACCESS_TOKEN:
+        return GRAPH_MESSAGES_URL, GRAPH_HEADERS
+    return (
+        f"https://graph.facebook.com/{GRAPH_API_VERSION}/{phone_number_id}/messages",
+        {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+    )
+
+async def close_http_client():
+    """Close the shared HTTP clients (called on app shutdown)"""
+    await http_client.aclose()
+    await supabase_client.aclose()
+    if redis_client is not None:
+        await redis_client.aclose()
 
 # ============ SUPABASE HELPERS ============
 
-def get_supabase_headers(use_service_key=False) -> Dict[str, str]:
-    """Get headers for Supabase API requests"""
-    key = SUPABASE_SERVICE_KEY if use_service_key else SUPABASE_KEY
+def _build_supabase_headers(key: str) -> Dict[str, str]:
     return {
         "apikey": key,
         "Authorization": f"Bearer {key}",
         "Content-Type": "application/json"
     }
 
+# Keys never change at runtime, so every header set is built once and shared
+# (treat as read-only; per-request headers are merged over the client's by httpx)
+SUPABASE_HEADERS = _build_supabase_headers(SUPABASE_KEY)
+SUPABASE_SERVICE_HEADERS = _build_supabase_headers(SUPABASE_SERVICE_KEY)
+PREFER_REPRESENTATION = {"Prefer": "return=representation"}
+PREFER_MINIMAL = {"Prefer": "return=minimal"}
+PREFER_UPSERT = {"Prefer": "resolution=merge-duplicates,return=representation"}
+SUPABASE_SERVICE_HEADERS_RETURN_REPR = {**SUPABASE_SERVICE_HEADERS, **PREFER_REPRESENTATION}
+
+def get_supabase_headers(use_service_key=False) -> Dict[str, str]:
+    """Get headers for Supabase API requests (shared dict - copy before modifying)"""
+    return SUPABASE_SERVICE_HEADERS if use_service_key else SUPABASE_HEADERS
+
+# The one keep-alive pool for every Supabase REST call; carries the auth headers
+# so callers pass relative URLs like /rest/v1/leads. Failed connects are retried
+# briefly instead of surfacing as a 500.
+supabase_client = httpx.AsyncClient(
+    base_url=SUPABASE_URL or "",
+    headers=SUPABASE_HEADERS,
+    transport=httpx.AsyncHTTPTransport(
+        retries=2,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+    ),
+    timeout=10.0
+)
+
+# ============ API CALL LOGGING ============
+
+# api_logs rows are queued here and bulk-inserted by drain_api_logs(),
+# so no endpoint waits on a Supabase write just to record itself.
+# Bounded: if Supabase stalls, the oldest rows are dropped (and counted) instead of growing memory
+API_LOG_QUEUE_SIZE = 10_000
+api_log_queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=API_LOG_QUEUE_SIZE)
+api_logs_dropped = 0
+API_LOG_BATCH_SIZE = 100
+API_LOG_FLUSH_SECONDS = 1.0
+
 async def log_api_call(
     endpoint: str,
     method: str,
@@ -36,13 +256,14 @@ async def log_api_call(
     error: Optional[str] = None,
     response_time_ms: int = 0
 ):
-    """Log API call to database"""
+    """Queue an API call log entry for the database"""
+    global api_logs_dropped
     try:
         if not SUPABASE_URL or not SUPABASE_KEY:
             logger.debug(f"Supabase not configured, skipping log: {endpoint}")
             return
         
-        log_entry = {
+        row = {
             "endpoint": endpoint,
             "method": method,
             "phone": phone,
@@ -50,13 +271,15 @@ async def log_api_call(
             "error": error,
             "response_time_ms": response_time_ms
         }
-        
-        requests.post(
-            f"{SUPABASE_URL}/rest/v1/api_logs",
-            headers=get_supabase_headers(),
-            json=log_entry,
-            timeout=5
-        )
+        try:
+            api_log_queue.put_nowait(row)
+        except asyncio.QueueFull:
+            # Drop-oldest: recent calls are the ones worth keeping
+            api_log_queue.get_nowait()
+            api_log_queue.put_nowait(row)
+            api_logs_dropped += 1
+            if api_logs_dropped % 1000 == 1:
+                logger.warning(f"API log queue full - {api_logs_dropped} old log rows dropped so far")
         
         log_msg = f"[API LOG] {method} {endpoint} - {status_code}"
         if phone:
@@ -68,39 +291,299 @@ async def log_api_call(
     except Exception as e:
         logger.debug(f"Could not log API call: {e}")
 
+async def flush_api_logs(batch: List[Dict[str, Any]]):
+    """Insert a batch of api_logs rows in one request"""
+    if not batch:
+        return
+    try:
+        await supabase_client.post("/rest/v1/api_logs", json=batch)
+    except Exception as e:
+        logger.debug(f"Could not write {len(batch)} API logs: {e}")
+
+async def drain_api_logs():
+    """Background task: write queued API logs every 100 entries or 1s, whichever first"""
+    loop = asyncio.get_running_loop()
+    batch: List[Dict[str, Any]] = []
+    try:
+        while True:
+            batch.append(await api_log_queue.get())
+            deadline = loop.time() + API_LOG_FLUSH_SECONDS
+            while len(batch) < API_LOG_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(api_log_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await flush_api_logs(batch)
+            batch = []
+    except asyncio.CancelledError:
+        # Shutdown: write whatever is still pending
+        while not api_log_queue.empty():
+            batch.append(api_log_queue.get_nowait())
+        await flush_api_logs(batch)
+        raise
+
+# ============ WRITE BATCHING ============
+
+class MessageBatcher:
+    """Coalesces single-row inserts into bulk PostgREST inserts
+    
+    Rows submitted within `max_delay` seconds (up to `max_batch_size`) are grouped
+    by table and sent as one JSON-array POST. If a batch fails, its rows are retried
+    one at a time so a single bad row (e.g. a duplicate message_id) only fails its own caller.
+    Before start() (e.g. in scripts without the app lifespan) rows are written directly.
+    """
+    
+    def __init__(self, max_batch_size: int = 32, max_delay: float = 0.05, max_concurrency: int = 10):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: "asyncio.Queue[Tuple[str, Dict[str, Any], asyncio.Future]]" = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the worker and write anything still queued"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+    
+    async def submit(self, table: str, row: Dict[str, Any]) -> bool:
+        """Queue one row for `table`; resolves to True once its batch is stored"""
+        if self._task is None:
+            return await self._insert(table, [row])
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((table, row, future))
+        return await future
+    
+    async def _insert(self, table: str, rows: List[Dict[str, Any]]) -> bool:
+        if pg_pool is not None:
+            return await self._insert_pg(table, rows)
+        async with self._semaphore:
+            try:
+                response = await supabase_client.post(
+                    f"/rest/v1/{table}",
+                    headers=PREFER_MINIMAL,
+                    json=rows
+                )
+            except Exception as e:
+                logger.error(f"Bulk insert into {table} failed: {e}")
+                return False
+        if response.status_code in [200, 201, 204]:
+            logger.debug(f"Inserted {len(rows)} row(s) into {table}")
+            return True
+        logger.error(f"Bulk insert into {table} failed: {response.status_code} - {response.text[:200]}")
+        return False
+    
+    async def _insert_pg(self, table: str, rows: List[Dict[str, Any]]) -> bool:
+        # Column names come from our own row dicts, never from request input
+        columns = list(rows[0])
+        placeholders = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        try:
+            async with pg_pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(query, [tuple(row[c] for c in columns) for row in rows])
+            logger.debug(f"Inserted {len(rows)} row(s) into {table}")
+            return True
+        except Exception as e:
+            logger.error(f"Bulk insert into {table} failed: {e}")
+            return False
+    
+    async def _flush(self, batch: List[Tuple[str, Dict[str, Any], asyncio.Future]]):
+        by_table: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        for table, row, future in batch:
+            by_table.setdefault(table, []).append((row, future))
+        for table, items in by_table.items():
+            if await self._insert(table, [row for row, _ in items]):
+                results = [True] * len(items)
+            elif len(items) == 1:
+                results = [False]
+            else:
+                logger.warning(f"Retrying {len(items)} row(s) for {table} one at a time")
+                results = [await self._insert(table, [row]) for row, _ in items]
+            for (_, future), ok in zip(items, results):
+                if not future.done():
+                    future.set_result(ok)
+    
+    def _spawn_flush(self, batch):
+        task = asyncio.create_task(self._flush(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.max_delay
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                # Don't wait for the write - keep collecting the next batch
+                self._spawn_flush(batch)
+                batch = []
+        except asyncio.CancelledError:
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch:
+                self._spawn_flush(batch)
+            raise
+
+# Shared batcher for messages/conversations rows (started in the app lifespan)
+message_batcher = MessageBatcher()
+
+# ============ READ COALESCING ============
+
+MESSAGE_STATUS_COLUMNS = "id,message_id,phone,message,direction,status,created_at,updated_at"
+MESSAGE_STATUS_SQL = f"SELECT {MESSAGE_STATUS_COLUMNS} FROM messages WHERE message_id = ANY($1::text[])"
+
+class MessageStatusLoader:
+    """Coalesces concurrent message_id lookups into one `message_id=in.(...)` query
+    
+    Ids requested within `max_delay` seconds (up to `max_batch_size`) are fetched
+    together (asyncpg when DATABASE_URL is set, else PostgREST); each caller gets
+    (status_code, row, error_text) where row is None if not found.
+    Concurrent requests for the same id share one slot in the batch.
+    """
+    
+    def __init__(self, max_batch_size: int = 100, max_delay: float = 0.005):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+    
+    async def load(self, message_id: str) -> Tuple[int, Optional[Dict[str, Any]], str]:
+        future = self._pending.get(message_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[message_id] = loop.create_future()
+            if len(self._pending) >= self.max_batch_size:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_delay, self._dispatch)
+        # Shielded: one caller giving up must not cancel the others' result
+        return await asyncio.shield(future)
+    
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        task = asyncio.create_task(self._fetch(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+    
+    async def _fetch(self, batch: Dict[str, asyncio.Future]):
+        try:
+            rows_by_id: Dict[str, Dict[str, Any]] = {}
+            if pg_pool is not None:
+                status_code, error_text = 200, ""
+                for record in await pg_pool.fetch(MESSAGE_STATUS_SQL, list(batch)):
+                    rows_by_id.setdefault(record["message_id"], dict(record))
+            else:
+                quoted = ",".join('"' + mid.replace('"', '\\"') + '"' for mid in batch)
+                response = await supabase_client.get(
+                    "/rest/v1/messages",
+                    params={"message_id": f"in.({quoted})", "select": MESSAGE_STATUS_COLUMNS}
+                )
+                status_code, error_text = response.status_code, response.text
+                if status_code == 200:
+                    for row in orjson.loads(response.content):
+                        rows_by_id.setdefault(row.get("message_id"), row)
+            logger.debug(f"Status lookup for {len(batch)} message ids in one query")
+            for message_id, future in batch.items():
+                if not future.done():
+                    future.set_result((status_code, rows_by_id.get(message_id), error_text))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+
+# Shared loader for /message-status
+message_status_loader = MessageStatusLoader()
+
 # ============ MESSAGE STORAGE ============
 
-def add_to_recent_messages(
+# Redis lists (newest first) shared by every worker when REDIS_URL is set
+REDIS_RECENT_KEY = "recent_messages"
+REDIS_RECENT_PHONE_TTL = 86400
+
+async def add_to_recent_messages(
     message: str,
     sender: str,
     phone: str,
     direction: str = "sent"
 ):
-    """Add message to in-memory recent messages list"""
-    global recent_messages
-    
+    """Add message to the recent messages list (Redis when configured, else in-memory)"""
     msg_entry = {
         "message": message,
         "sender": sender,
         "phone": phone,
         "direction": direction,
         "status": "sent" if direction == "sent" else "received",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     }
     
+    if redis_client is not None:
+        try:
+            payload = orjson.dumps(msg_entry)
+            phone_key = f"{REDIS_RECENT_KEY}:{phone}"
+            # Push + trim both lists in one round trip so they never grow unbounded
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.lpush(REDIS_RECENT_KEY, payload)
+                pipe.ltrim(REDIS_RECENT_KEY, 0, MAX_RECENT_MESSAGES - 1)
+                pipe.lpush(phone_key, payload)
+                pipe.ltrim(phone_key, 0, MAX_RECENT_MESSAGES - 1)
+                pipe.expire(phone_key, REDIS_RECENT_PHONE_TTL)
+                await pipe.execute()
+            return
+        except Exception as e:
+            logger.warning(f"Redis recent messages unavailable, using memory: {e}")
+    
     recent_messages.append(msg_entry)
     
-    if len(recent_messages) > MAX_RECENT_MESSAGES:
-        recent_messages = recent_messages[-MAX_RECENT_MESSAGES:]
-
-def get_recent_messages(phone: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
-    """Get recent messages from in-memory storage"""
-    if phone:
-        filtered = [m for m in recent_messages if m.get("phone") == phone]
-    else:
-        filtered = recent_messages
+    phone_messages = recent_messages_by_phone.get(phone)
+    if phone_messages is None:
+        if len(recent_messages_by_phone) >= MAX_RECENT_PHONES:
+            # Forget the phone that was first seen longest ago
+            recent_messages_by_phone.pop(next(iter(recent_messages_by_phone)))
+        phone_messages = recent_messages_by_phone[phone] = deque(maxlen=MAX_RECENT_MESSAGES)
+    phone_messages.append(msg_entry)
+
+async def get_recent_messages(phone: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """Get recent messages (oldest first) from Redis when configured, else in-memory storage"""
+    if redis_client is not None:
+        try:
+            key = f"{REDIS_RECENT_KEY}:{phone}" if phone else REDIS_RECENT_KEY
+            raw = await redis_client.lrange(key, 0, limit - 1)
+            return [orjson.loads(item) for item in reversed(raw)]
+        except Exception as e:
+            logger.warning(f"Redis recent messages unavailable, using memory: {e}")
     
-    return filtered[-limit:]
+    source = recent_messages_by_phone.get(phone, ()) if phone else recent_messages
+    # Walk back only `limit` entries, then restore oldest-first order
+    messages = list(islice(reversed(source), limit))
+    messages.reverse()
+    return messages
 
 # ============ DATABASE - MESSAGES ============
 
@@ -122,8 +605,6 @@ async def store_message(
             logger.warning("Supabase not configured")
             return False, ""
         
-        headers = get_supabase_headers()
-        
         message_data = {
             "phone": phone,
             "message": message,
@@ -139,11 +620,10 @@ async def store_message(
         
         logger.debug(f"Storing message to database: {phone} - {direction} - {status}")
         
-        response = requests.post(
-            f"{SUPABASE_URL}/rest/v1/messages",
-            headers={**headers, "Prefer": "return=representation"},
-            json=message_data,
-            timeout=10
+        response = await supabase_client.post(
+            "/rest/v1/messages",
+            headers=PREFER_REPRESENTATION,
+            json=message_data
         )
         
         if response.status_code in [200, 201]:
@@ -164,6 +644,43 @@ async def store_message(
 
 # ============ DATABASE - LEADS ============
 
+async def _upsert_lead(phone: str, name: str, status: str = "new") -> Optional[Dict[str, Any]]:
+    """Get-or-create a lead in one round trip (upsert on the unique phone column)
+    
+    Only `phone` is sent so an existing lead's name/status are never overwritten;
+    a freshly inserted row (no name yet) gets its name and status set afterwards.
+    The phone is normalized here so lead rows and `lead_cache` keys always match.
+    """
+    phone_clean = normalize_phone(phone)
+    cached = lead_cache.get(phone_clean)
+    if cached is not None:
+        return cached
+    
+    response = await supabase_client.post(
+        "/rest/v1/leads?on_conflict=phone",
+        headers=PREFER_UPSERT,
+        json={"phone": phone_clean}
+    )
+    
+    if response.status_code not in [200, 201]:
+        logger.error(f"Failed to upsert lead: {response.status_code} - {response.text}")
+        return None
+    
+    result = response.json()
+    lead = result[0] if isinstance(result, list) and result else {"phone": phone_clean}
+    
+    if not lead.get("name"):
+        fields = {"name": name, "status": status}
+        await supabase_client.patch(
+            f"/rest/v1/leads?phone=eq.{phone_clean}",
+            json=fields
+        )
+        lead.update(fields)
+        logger.info(f"✓ Lead created: {phone_clean}")
+    
+    lead_cache.set(phone_clean, lead, ttl=LEAD_CACHE_TTL)
+    return lead
+
 async def store_lead(phone: str, name: Optional[str] = None) -> Tuple[bool, Dict[str, Any]]:
     """Store or get existing lead in Supabase"""
     try:
@@ -171,48 +688,14 @@ async def store_lead(phone: str, name: Optional[str] = None) -> Tuple[bool, Dict
             logger.warning("Supabase not configured")
             return False, {}
         
-        headers = get_supabase_headers()
-        phone_clean = phone.replace("+", "").replace(" ", "")
-        
-        # Check if lead already exists
-        logger.debug(f"Checking for existing lead: {phone_clean}")
-        check_response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/leads?phone=eq.{phone_clean}",
-            headers=headers,
-            timeout=10
-        )
-        
-        if check_response.status_code == 200:
-            existing_leads = check_response.json()
-            if existing_leads and len(existing_leads) > 0:
-                logger.info(f"Lead already exists: {phone_clean}")
-                return True, existing_leads[0]
+        phone_clean = normalize_phone(phone)
         
-        # Create new lead
-        lead_data = {
-            "phone": phone_clean,
-            "name": name or f"Lead {phone_clean}",
-            "status": "new"
-        }
-        
-        logger.debug(f"Creating new lead: {phone_clean}")
-        
-        create_response = requests.post(
-            f"{SUPABASE_URL}/rest/v1/leads",
-            headers={**headers, "Prefer": "return=representation"},
-            json=lead_data,
-            timeout=10
-        )
+        logger.debug(f"Upserting lead: {phone_clean}")
+        lead = await _upsert_lead(phone_clean, name or f"Lead {phone_clean}")
         
-        if create_response.status_code in [200, 201]:
-            result = create_response.json()
-            if isinstance(result, list) and result:
-                logger.info(f"✓ Lead created: {phone_clean}")
-                return True, result[0]
-            return True, lead_data
-        else:
-            logger.error(f"Failed to create lead: {create_response.status_code} - {create_response.text}")
+        if lead is None:
             return False, {}
+        return True, lead
     
     except Exception as e:
         logger.error(f"Error storing lead: {e}", exc_info=True)
@@ -225,12 +708,8 @@ async def get_leads(limit: int = 50) -> Tuple[bool, List[Dict[str, Any]]]:
             logger.warning("Supabase not configured")
             return False, []
         
-        headers = get_supabase_headers()
-        
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/leads?limit={limit}&order=created_at.desc",
-            headers=headers,
-            timeout=10
+        response = await supabase_client.get(
+            f"/rest/v1/leads?limit={limit}&order=created_at.desc"
         )
         
         if response.status_code == 200:
@@ -251,19 +730,17 @@ async def update_lead_status(phone: str, status: str) -> bool:
         if not SUPABASE_URL or not SUPABASE_KEY:
             return False
         
-        headers = get_supabase_headers()
-        phone_clean = phone.replace("+", "").replace(" ", "")
+        phone_clean = normalize_phone(phone)
         
         update_data = {"status": status}
+        lead_cache.pop(phone_clean)
         
-        response = requests.patch(
-            f"{SUPABASE_URL}/rest/v1/leads?phone=eq.{phone_clean}",
-            headers=headers,
-            json=update_data,
-            timeout=10
+        response = await supabase_client.patch(
+            f"/rest/v1/leads?phone=eq.{phone_clean}",
+            json=update_data
         )
         
-        if response.status_code == 200:
+        if response.status_code in (200, 204):
             logger.info(f"Lead status updated: {phone_clean} -> {status}")
             return True
         else:
@@ -292,8 +769,6 @@ async def store_conversation(
             logger.warning("Supabase not configured")
             return False, {}
         
-        headers = get_supabase_headers()
-        
         conversation_data = {
             "lead_id": lead_id,
             "phone": phone,
@@ -307,11 +782,10 @@ async def store_conversation(
         
         logger.debug(f"Storing conversation: {phone} - {sender} ({direction})")
         
-        response = requests.post(
-            f"{SUPABASE_URL}/rest/v1/conversations",
-            headers={**headers, "Prefer": "return=representation"},
-            json=conversation_data,
-            timeout=10
+        response = await supabase_client.post(
+            "/rest/v1/conversations",
+            headers=PREFER_REPRESENTATION,
+            json=conversation_data
         )
         
         if response.status_code in [200, 201]:
@@ -335,18 +809,12 @@ async def get_conversation(phone: str, limit: int = 50) -> Tuple[bool, List[Dict
             return False, []
         
         # Normalize phone - add 91 if not present
-        phone_clean = phone.replace("+", "").replace(" ", "")
-        if not phone_clean.startswith("91"):
-            phone_clean = "91" + phone_clean
-        
-        headers = get_supabase_headers()
+        phone_clean = normalize_phone(phone)
         
         logger.debug(f"Fetching conversation for {phone_clean}")
         
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/conversations?phone=eq.{phone_clean}&limit={limit}&order=created_at.desc",
-            headers=headers,
-            timeout=10
+        response = await supabase_client.get(
+            f"/rest/v1/conversations?phone=eq.{phone_clean}&limit={limit}&order=created_at.desc"
         )
         
         if response.status_code == 200:
@@ -371,7 +839,8 @@ async def store_conversation_with_message(
     message_id: Optional[str] = None,
     media_url: Optional[str] = None,
     media_type: Optional[str] = None,
-    caption: Optional[str] = None
+    caption: Optional[str] = None,
+    lead_id: Optional[str] = None
 ) -> Tuple[bool, Dict[str, Any]]:
     """
     Store message in BOTH messages and conversations tables together
@@ -388,6 +857,7 @@ async def store_conversation_with_message(
     - media_url: URL if media message
     - media_type: Image, video, document, etc.
     - caption: Caption for media (optional)
+    - lead_id: Lead the caller already has (skips the lead lookup)
     
     Returns: (success: bool, message_dict: dict)
     """
@@ -397,15 +867,13 @@ async def store_conversation_with_message(
             return False, {}
         
         # Normalize phone
-        phone_clean = phone.replace("+", "").replace(" ", "")
-        if not phone_clean.startswith("91"):
-            phone_clean = "91" + phone_clean
+        phone_clean = normalize_phone(phone)
         
         # Generate message_id if not provided
         if not message_id:
-            message_id = str(__import__('uuid').uuid4())
+            message_id = secrets.token_hex(16)
         
-        # Step 1: Store message in messages table
+        # Step 1: Build the messages row
         message_data = {
             "phone": phone_clean,
             "message": message,
@@ -419,62 +887,15 @@ async def store_conversation_with_message(
             "caption": caption
         }
         
-        headers = get_supabase_headers()
-        
         logger.debug(f"Storing message+conversation: {phone_clean} - {direction} ({sender})")
         
-        msg_response = requests.post(
-            f"{SUPABASE_URL}/rest/v1/messages",
-            headers={**headers, "Prefer": "return=representation"},
-            json=message_data,
-            timeout=10
-        )
-        
-        msg_success = msg_response.status_code in [200, 201]
+        # Step 2: Create/get lead (unless the caller passed it in)
+        if not lead_id:
+            lead = await _upsert_lead(phone_clean, f"Lead {phone_clean}", status="active")
+            lead_id = lead.get("id") if lead else None
         
-        if msg_success:
-            logger.info(f"✓ Stored message: {phone_clean} ({direction})")
-        else:
-            logger.error(f"Failed to store message: {msg_response.status_code} - {msg_response.text[:200]}")
-        
-        # Step 2: Create/get lead
-        lead_data = {
-            "phone": phone_clean,
-            "name": f"Lead {phone_clean}",
-            "status": "active"
-        }
-        
-        # Check if lead exists
-        lead_check = requests.get(
-            f"{SUPABASE_URL}/rest/v1/leads?phone=eq.{phone_clean}&limit=1",
-            headers=headers,
-            timeout=10
-        )
-        
-        lead_id = None
-        
-        if lead_check.status_code == 200:
-            existing_leads = lead_check.json()
-            if existing_leads:
-                lead_id = existing_leads[0].get("id")
-                logger.debug(f"Using existing lead: {lead_id}")
-            else:
-                # Create new lead
-                lead_response = requests.post(
-                    f"{SUPABASE_URL}/rest/v1/leads",
-                    headers={**headers, "Prefer": "return=representation"},
-                    json=lead_data,
-                    timeout=10
-                )
-                
-                if lead_response.status_code in [200, 201]:
-                    result = lead_response.json()
-                    if isinstance(result, list) and result:
-                        lead_id = result[0].get("id")
-                        logger.debug(f"Created new lead: {lead_id}")
-        
-        # Step 3: Store conversation if we have a lead_id
-        conv_success = False
+        # Step 3: Queue both rows; they go out with whatever else is being stored right now
+        writes = [message_batcher.submit("messages", message_data)]
         if lead_id:
             conversation_data = {
                 "lead_id": lead_id,
@@ -486,23 +907,23 @@ async def store_conversation_with_message(
                 "status": status,
                 "message_id": message_id
             }
-            
-            conv_response = requests.post(
-                f"{SUPABASE_URL}/rest/v1/conversations",
-                headers={**headers, "Prefer": "return=representation"},
-                json=conversation_data,
-                timeout=10
-            )
-            
-            conv_success = conv_response.status_code in [200, 201]
-            
-            if conv_success:
-                logger.info(f"✓ Stored conversation: {phone_clean} (Lead: {lead_id})")
-            else:
-                logger.error(f"Failed to store conversation: {conv_response.status_code} - {conv_response.text[:200]}")
+            writes.append(message_batcher.submit("conversations", conversation_data))
         else:
             logger.warning(f"Could not store conversation - no lead_id for {phone_clean}")
         
+        msg_success, *conv_result = await asyncio.gather(*writes)
+        
+        if msg_success:
+            response_cache.clear()
+            logger.info(f"✓ Stored message: {phone_clean} ({direction})")
+        else:
+            logger.error(f"Failed to store message for {phone_clean}")
+        
+        if conv_result and conv_result[0]:
+            logger.info(f"✓ Stored conversation: {phone_clean} (Lead: {lead_id})")
+        elif conv_result:
+            logger.error(f"Failed to store conversation for {phone_clean}")
+        
         # Return success if at least message was stored
         return msg_success, message_data if msg_success else {}
     
@@ -522,8 +943,6 @@ async def update_message_status(
         if not SUPABASE_URL or not SUPABASE_KEY:
             return False
         
-        headers = get_supabase_headers()
-        
         update_data = {
             "status": status,
             "error_message": error_message
@@ -531,14 +950,34 @@ async def update_message_status(
         
         logger.debug(f"Updating message status: {message_id} -> {status}")
         
-        response = requests.patch(
-            f"{SUPABASE_URL}/rest/v1/messages?message_id=eq.{message_id}",
-            headers=headers,
-            json=update_data,
-            timeout=10
+        if pg_pool is not None:
+            command_tag = await pg_pool.execute(
+                "UPDATE messages SET status = $1, error_message = $2 WHERE message_id = $3",
+                status, error_message, message_id
+            )
+            response_cache.clear()
+            message_status_cache.pop(message_id)
+            # asyncpg returns the command tag, e.g. "UPDATE 0" when nothing matched
+            if command_tag.rsplit(" ", 1)[-1] == "0":
+                logger.warning(f"No message found to update: {message_id}")
+                return False
+            logger.info(f"✓ Message status updated: {message_id} -> {status}")
+            return True
+        
+        # Ask for just the matched ids back so a PATCH that hit no row is reported like the pg path
+        response = await supabase_client.patch(
+            f"/rest/v1/messages?message_id=eq.{message_id}&select=message_id",
+            headers=PREFER_REPRESENTATION,
+            json=update_data
         )
+        # Invalidate whatever the outcome: a failed PATCH may still have landed
+        response_cache.clear()
+        message_status_cache.pop(message_id)
         
-        if response.status_code == 200:
+        if response.status_code == 200 and not response.json():
+            logger.warning(f"No message found to update: {message_id}")
+            return False
+        if response.status_code in (200, 204):
             logger.info(f"✓ Message status updated: {message_id} -> {status}")
             return True
         else:
@@ -560,6 +999,22 @@ async def update_message_status_advanced(
 
 # ============ GEMINI AI HELPERS ============
 
+GEMINI_MODEL_NAME = "gemini-2.5-pro"
+_gemini_model = None
+
+def get_gemini_model():
+    """Shared Gemini model, configured once on first use (None if the SDK or key is missing)"""
+    global _gemini_model
+    if _gemini_model is None and GEMINI_API_KEY:
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            logger.warning("google.generativeai not installed")
+            return None
+        genai.configure(api_key=GEMINI_API_KEY)
+        _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _gemini_model
+
 async def generate_ai_reply(message: str, phone: str, conversation_history: List[str] = None) -> str:
     """Generate AI reply using Gemini 2.5 Pro"""
     try:
@@ -571,15 +1026,10 @@ async def generate_ai_reply(message: str, phone: str, conversation_history: List
             logger.warning("Gemini API key not configured")
             return "Thank you for your message. An agent will respond soon."
         
-        try:
-            import google.generativeai as genai
-        except ImportError:
-            logger.warning("google.generativeai not installed")
+        model = get_gemini_model()
+        if model is None:
             return "Thank you for your message. An agent will respond soon."
         
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-2.5-pro")
-        
         # Build conversation context
         context = f"You are a helpful WhatsApp customer service agent. Answer briefly and professionally."
         if conversation_history:
@@ -589,7 +1039,8 @@ async def generate_ai_reply(message: str, phone: str, conversation_history: List
         
         logger.debug(f"Generating AI reply for {phone}")
         
-        response = model.generate_content(context)
+        # Blocking SDK call - keep it off the event loop
+        response = await asyncio.to_thread(model.generate_content, context)
         reply = response.text if response.text else "Thank you for your message."
         
         logger.info(f"✓ AI reply generated for {phone}")
@@ -601,7 +1052,7 @@ async def generate_ai_reply(message: str, phone: str, conversation_history: List
 
 # ============ WHATSAPP API HELPERS ============
 
-def send_whatsapp_message(
+async def send_whatsapp_message(
     phone_number_id: str,
     access_token: str,
     phone: str,
@@ -613,12 +1064,7 @@ def send_whatsapp_message(
             logger.error("Phone number ID or access token is missing")
             return False, ""
         
-        url = f"https://graph.facebook.com/v19.0/{phone_number_id}/messages"
-        
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
+        url, headers = graph_messages_target(phone_number_id, access_token)
         
         payload = {
             "messaging_product": "whatsapp",
@@ -629,24 +1075,22 @@ def send_whatsapp_message(
         
         logger.debug(f"Sending text message to {phone}")
         
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        
-        logger.debug(f"WhatsApp API response: {response.status_code} - {response.text}")
+        response = await http_client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
         
-        if response.status_code in [200, 201]:
-            data = response.json()
-            message_id = data.get("messages", [{}])[0].get("id", "unknown")
-            logger.info(f"✓ WhatsApp text sent to {phone} (ID: {message_id})")
-            return True, message_id
-        else:
-            logger.error(f"WhatsApp API failed: {response.status_code} - {response.text}")
-            return False, ""
+        # Success path never decodes the body as text
+        message_id = response.json().get("messages", [{}])[0].get("id", "unknown")
+        logger.info("✓ WhatsApp text sent to %s (ID: %s)", phone, message_id)
+        return True, message_id
     
+    except httpx.HTTPStatusError as e:
+        logger.error("WhatsApp API failed: %d - %s", e.response.status_code, e.response.text)
+        return False, ""
     except Exception as e:
         logger.error(f"Error sending WhatsApp message: {e}", exc_info=True)
         return False, ""
 
-def send_media_message(
+async def send_media_message(
     phone_number_id: str,
     access_token: str,
     phone: str,
@@ -664,12 +1108,7 @@ def send_media_message(
         # Normalize media type
         media_type_str = str(media_type).split(".")[-1].lower() if hasattr(media_type, 'value') else str(media_type).lower()
         
-        url = f"https://graph.facebook.com/v19.0/{phone_number_id}/messages"
-        
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
+        url, headers = graph_messages_target(phone_number_id, access_token)
         
         # Build media object
         media_object = {"url": media_url}
@@ -690,7 +1129,7 @@ def send_media_message(
         
         logger.debug(f"Sending {media_type_str} to {phone}: {media_url}")
         
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = await http_client.post(url, json=payload, headers=headers)
         
         logger.debug(f"WhatsApp media API response: {response.status_code}")
         
@@ -707,7 +1146,7 @@ def send_media_message(
         logger.error(f"Error sending WhatsApp media: {e}", exc_info=True)
         return False, ""
 
-def send_template_message(
+async def send_template_message(
     phone_number_id: str,
     access_token: str,
     phone: str,
@@ -722,11 +1161,9 @@ def send_template_message(
             return False, ""
         
         # Normalize phone
-        phone_clean = phone.replace("+", "").replace(" ", "")
-        if not phone_clean.startswith("91"):
-            phone_clean = "91" + phone_clean
+        phone_clean = normalize_phone(phone)
         
-        url = f"https://graph.facebook.com/v19.0/{phone_number_id}/messages"
+        url, headers = graph_messages_target(phone_number_id, access_token)
         
         # Build template parameters
         body_parameters = []
@@ -749,14 +1186,9 @@ def send_template_message(
                 {"type": "body", "parameters": body_parameters}
             ]
         
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        
         logger.debug(f"Sending template '{template_name}' to {phone_clean}")
         
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = await http_client.post(url, json=payload, headers=headers)
         
         if response.status_code in [200, 201]:
             data = response.json()
@@ -779,15 +1211,10 @@ async def analyze_sentiment(message: str) -> str:
         if not GEMINI_API_KEY:
             return "neutral"
         
-        try:
-            import google.generativeai as genai
-        except ImportError:
-            logger.warning("google.generativeai not installed")
+        model = get_gemini_model()
+        if model is None:
             return "neutral"
         
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-2.5-pro")
-        
         # Simple prompt for faster response
         if not message or len(message.strip()) == 0:
             return "neutral"
@@ -795,7 +1222,7 @@ async def analyze_sentiment(message: str) -> str:
         prompt = f"One word only - is this positive, negative, or neutral? Message: {message[:200]}"
         
         logger.debug(f"Analyzing sentiment for message: {message[:50]}...")
-        response = model.generate_content(prompt)
+        response = await asyncio.to_thread(model.generate_content, prompt)
         
         sentiment = response.text.strip().lower()
         logger.debug(f"Gemini response: {sentiment}")
@@ -815,9 +1242,7 @@ async def get_conversation_sentiment(phone: str) -> Dict[str, Any]:
     """Get sentiment analysis for a conversation using Gemini 2.5 Pro"""
     try:
         # Normalize phone
-        phone_clean = phone.replace("+", "").replace(" ", "")
-        if not phone_clean.startswith("91"):
-            phone_clean = "91" + phone_clean
+        phone_clean = normalize_phone(phone)
         
         logger.debug(f"Getting sentiment for {phone_clean}")
         
@@ -861,6 +1286,47 @@ async def get_conversation_sentiment(phone: str) -> Dict[str, Any]:
         logger.error(f"Error getting conversation sentiment: {e}", exc_info=True)
         return {}
 
+RECENT_MESSAGES_SQL = """
+    SELECT * FROM messages
+    WHERE $1::text IS NULL OR phone = $1
+    ORDER BY created_at DESC
+    LIMIT $2
+"""
+
+# Same grouping as the messages_stats function, run directly over asyncpg
+MESSAGE_BREAKDOWN_SQL = f"""
+    SELECT direction, status, count(*) AS n
+    FROM ({RECENT_MESSAGES_SQL}) recent
+    GROUP BY direction, status
+"""
+
+async def get_recent_message_rows(phone_clean: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """Newest `limit` messages (all phones when phone_clean is None) straight from Postgres"""
+    records = await pg_pool.fetch(RECENT_MESSAGES_SQL, phone_clean, limit)
+    return [dict(record) for record in records]
+
+async def get_message_breakdown(phone_clean: Optional[str] = None, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """(direction, status, n) groups over the newest `limit` messages via the messages_stats RPC
+    
+    Returns None when the function isn't installed (or the call fails) so callers can
+    fall back to fetching rows.
+    """
+    try:
+        if pg_pool is not None:
+            return [dict(record) for record in await pg_pool.fetch(MESSAGE_BREAKDOWN_SQL, phone_clean, limit)]
+        
+        response = await supabase_client.post(
+            "/rest/v1/rpc/messages_stats",
+            json={"p_phone": phone_clean, "p_limit": limit}
+        )
+        if response.status_code == 200:
+            return orjson.loads(response.content)
+        if response.status_code != 404:
+            logger.warning(f"messages_stats RPC failed: {response.status_code} - {response.text[:100]}")
+    except Exception as e:
+        logger.warning(f"messages_stats RPC error: {e}")
+    return None
+
 async def get_message_stats(phone: Optional[str] = None) -> Dict[str, Any]:
     """Get message statistics from messages table"""
     try:
@@ -868,39 +1334,51 @@ async def get_message_stats(phone: Optional[str] = None) -> Dict[str, Any]:
             logger.warning("Supabase not configured")
             return {}
         
-        headers = get_supabase_headers()
-        
         # Normalize phone if provided
-        if phone:
-            phone_clean = phone.replace("+", "").replace(" ", "")
-            if not phone_clean.startswith("91"):
-                phone_clean = "91" + phone_clean
-            url = f"{SUPABASE_URL}/rest/v1/messages?phone=eq.{phone_clean}&select=direction,status"
-            logger.debug(f"Getting stats for phone: {phone_clean}")
-        else:
-            url = f"{SUPABASE_URL}/rest/v1/messages?select=direction,status"
-            logger.debug("Getting stats for all messages")
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        
-        if response.status_code != 200:
-            logger.error(f"Failed to get messages: {response.status_code} - {response.text}")
-            return {}
-        
-        messages = response.json()
-        logger.debug(f"Retrieved {len(messages)} messages for stats")
+        phone_clean = normalize_phone(phone) if phone else None
+        logger.debug(f"Getting stats for {phone_clean or 'all messages'}")
+        
+        # Grouped counts from Postgres; only pull every row if the RPC isn't installed
+        groups = await get_message_breakdown(phone_clean)
+        if groups is None:
+            params = {"select": "direction,status"}
+            if phone_clean:
+                params["phone"] = f"eq.{phone_clean}"
+            response = await supabase_client.get("/rest/v1/messages", params=params)
+            
+            if response.status_code != 200:
+                logger.error(f"Failed to get messages: {response.status_code} - {response.text}")
+                return {}
+            
+            groups = [{"direction": m.get("direction"), "status": m.get("status"), "n": 1} for m in orjson.loads(response.content)]
+        
+        total = sent = received = delivered = read = failed = 0
+        for group in groups:
+            n = group["n"]
+            status = group.get("status")
+            total += n
+            if group.get("direction") == "outbound":
+                sent += n
+            elif group.get("direction") == "inbound":
+                received += n
+            if status in ("delivered", "read", "seen"):
+                delivered += n
+                if status != "delivered":
+                    read += n
+            elif status == "failed":
+                failed += n
         
         stats = {
-            "total_messages": len(messages),
-            "total_sent": sum(1 for m in messages if m.get("direction") == "outbound"),
-            "total_received": sum(1 for m in messages if m.get("direction") == "inbound"),
-            "delivered_count": sum(1 for m in messages if m.get("status") in ["delivered", "read", "seen"]),
-            "failed_count": sum(1 for m in messages if m.get("status") == "failed")
+            "total_messages": total,
+            "total_sent": sent,
+            "total_received": received,
+            "delivered_count": delivered,
+            "failed_count": failed
         }
         
-        if stats["total_sent"] > 0:
-            stats["delivery_rate"] = round((stats["delivered_count"] / stats["total_sent"]) * 100, 2)
-            stats["read_rate"] = round((sum(1 for m in messages if m.get("status") in ["read", "seen"]) / stats["total_sent"]) * 100, 2)
+        if sent > 0:
+            stats["delivery_rate"] = round((delivered / sent) * 100, 2)
+            stats["read_rate"] = round((read / sent) * 100, 2)
         else:
             stats["delivery_rate"] = 0
             stats["read_rate"] = 0
@@ -915,8 +1393,10 @@ async def get_message_stats(phone: Optional[str] = None) -> Dict[str, Any]:
 # ============ WEBHOOK HELPERS ============
 
 def verify_webhook_token(token: str, expected_token: str) -> bool:
-    """Verify webhook token"""
-    return token == expected_token
+    """Verify webhook token (constant-time compare)"""
+    if not token or not expected_token:
+        return False
+    return hmac.compare_digest(token.encode(), expected_token.encode())
 
 # ============ TEMPLATE HELPERS ============
 
@@ -947,7 +1427,7 @@ async def create_whatsapp_template(
         }
         
         # Call Meta Graph API
-        url = f"https://graph.facebook.com/v19.0/{waba_id}/message_templates"
+        url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{waba_id}/message_templates"
         headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
@@ -963,7 +1443,7 @@ async def create_whatsapp_template(
         
         for attempt in range(max_retries):
             try:
-                response = requests.post(url, json=template_payload, headers=headers, timeout=timeout_seconds)
+                response = await http_client.post(url, json=template_payload, headers=headers, timeout=timeout_seconds)
                 
                 if response.status_code in [200, 201]:
                     result = response.json()
@@ -996,7 +1476,7 @@ async def create_whatsapp_template(
                         "details": error_response
                     }
             
-            except requests.exceptions.Timeout as timeout_err:
+            except httpx.TimeoutException:
                 logger.warning(f"Timeout on attempt {attempt + 1}/{max_retries}. Meta API took >{timeout_seconds}s")
                 if attempt < max_retries - 1:
                     logger.info("Retrying...")
@@ -1008,7 +1488,7 @@ async def create_whatsapp_template(
                         "details": "WhatsApp servers may be slow. Your template may still be created - check your Meta Business Manager."
                     }
             
-            except requests.exceptions.RequestException as req_err:
+            except httpx.RequestError as req_err:
                 logger.error(f"Network error calling Meta API: {req_err}")
                 return False, {
                     "error": f"Network error: {str(req_err)}",
@@ -1032,12 +1512,12 @@ async def get_whatsapp_template_status(
         if not waba_id or not access_token or not template_id:
             return False, "UNKNOWN"
         
-        url = f"https://graph.facebook.com/v19.0/{template_id}"
+        url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{template_id}"
         headers = {
             "Authorization": f"Bearer {access_token}"
         }
         
-        response = requests.get(url, headers=headers, timeout=10)
+        response = await http_client.get(url, headers=headers)
         
         if response.status_code == 200:
             result = response.json()
@@ -1061,8 +1541,6 @@ async def create_admin(admin_data: Dict[str, Any]) -> Tuple[bool, Optional[Dict[
             logger.warning("Supabase not configured")
             return False, None
         
-        headers = get_supabase_headers(use_service_key=True)
-        
         # Hash password (in production, use proper bcrypt)
         import hashlib
         password_hash = hashlib.sha256(admin_data.get("password", "").encode()).hexdigest()
@@ -1074,15 +1552,13 @@ async def create_admin(admin_data: Dict[str, Any]) -> Tuple[bool, Optional[Dict[
             "password_hash": password_hash,
             "role": admin_data.get("role", "admin"),
             "status": "active",
-            "permissions": admin_data.get("permissions", {"all": True}),
-            "created_at": datetime.now().isoformat()
+            "permissions": admin_data.get("permissions", {"all": True})
         }
         
-        response = requests.post(
-            f"{SUPABASE_URL}/rest/v1/admins",
-            headers={**headers, "Prefer": "return=representation"},
-            json=admin_record,
-            timeout=10
+        response = await supabase_client.post(
+            "/rest/v1/admins",
+            headers=SUPABASE_SERVICE_HEADERS_RETURN_REPR,
+            json=admin_record
         )
         
         if response.status_code == 201:
@@ -1106,8 +1582,6 @@ async def create_agent(agent_data: Dict[str, Any], created_by: Optional[str] = N
             logger.warning("Supabase not configured")
             return False, None
         
-        headers = get_supabase_headers(use_service_key=True)
-        
         # Hash password (in production, use proper bcrypt)
         import hashlib
         password_hash = hashlib.sha256(agent_data.get("password", "").encode()).hexdigest()
@@ -1121,15 +1595,13 @@ async def create_agent(agent_data: Dict[str, Any], created_by: Optional[str] = N
             "status": "active",
             "assigned_leads_limit": agent_data.get("assigned_leads_limit", 50),
             "is_available": True,
-            "created_by": created_by,
-            "created_at": datetime.now().isoformat()
+            "created_by": created_by
         }
         
-        response = requests.post(
-            f"{SUPABASE_URL}/rest/v1/agents",
-            headers={**headers, "Prefer": "return=representation"},
-            json=agent_record,
-            timeout=10
+        response = await supabase_client.post(
+            "/rest/v1/agents",
+            headers=SUPABASE_SERVICE_HEADERS_RETURN_REPR,
+            json=agent_record
         )
         
         if response.status_code == 201:
@@ -1153,12 +1625,9 @@ async def get_all_admins() -> Tuple[bool, List[Dict[str, Any]]]:
             logger.warning("Supabase not configured")
             return False, []
         
-        headers = get_supabase_headers(use_service_key=True)
-        
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/admins?select=*&order=created_at.desc",
-            headers=headers,
-            timeout=10
+        response = await supabase_client.get(
+            "/rest/v1/admins?select=*&order=created_at.desc",
+            headers=SUPABASE_SERVICE_HEADERS
         )
         
         if response.status_code == 200:
@@ -1182,12 +1651,9 @@ async def get_all_agents() -> Tuple[bool, List[Dict[str, Any]]]:
             logger.warning("Supabase not configured")
             return False, []
         
-        headers = get_supabase_headers(use_service_key=True)
-        
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/agents?select=*&order=created_at.desc",
-            headers=headers,
-            timeout=10
+        response = await supabase_client.get(
+            "/rest/v1/agents?select=*&order=created_at.desc",
+            headers=SUPABASE_SERVICE_HEADERS
         )
         
         if response.status_code == 200:
@@ -1212,13 +1678,10 @@ async def send_message_from_agent(agent_id: str, lead_phone: str, message: str)
             logger.warning("Supabase not configured")
             return False, None
             
-        headers = get_supabase_headers(use_service_key=True)
-        
         # Get agent details
-        agent_response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/agents?id=eq.{agent_id}&select=*",
-            headers=headers,
-            timeout=10
+        agent_response = await supabase_client.get(
+            f"/rest/v1/agents?id=eq.{agent_id}&select=*",
+            headers=SUPABASE_SERVICE_HEADERS
         )
         
         if agent_response.status_code != 200 or not agent_response.json():
@@ -1228,7 +1691,7 @@ async def send_message_from_agent(agent_id: str, lead_phone: str, message: str)
         agent = agent_response.json()[0]
         
         # Send WhatsApp message
-        success, msg_id = send_whatsapp_message(
+        success, msg_id = await send_whatsapp_message(
             PHONE_NUMBER_ID,
             ACCESS_TOKEN,
             lead_phone,
@@ -1249,11 +1712,10 @@ async def send_message_from_agent(agent_id: str, lead_phone: str, message: str)
                 )
                 
                 # Update agent activity
-                requests.patch(
-                    f"{SUPABASE_URL}/rest/v1/agents?id=eq.{agent_id}",
-                    headers=headers,
-                    json={"last_activity": datetime.now().isoformat()},
-                    timeout=10
+                await supabase_client.patch(
+                    f"/rest/v1/agents?id=eq.{agent_id}",
+                    headers=SUPABASE_SERVICE_HEADERS,
+                    json={"last_activity": utc_now_iso()}
                 )
             
             logger.info(f"✅ Agent {agent.get('name')} sent message to {lead_phone}")
@@ -1273,13 +1735,10 @@ async def get_agent_conversations(agent_id: str, limit: int = 50) -> Tuple[bool,
             logger.warning("Supabase not configured")
             return False, {}
         
-        headers = get_supabase_headers(use_service_key=True)
-        
         # Get agent info
-        agent_response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/agents?id=eq.{agent_id}&select=*",
-            headers=headers,
-            timeout=10
+        agent_response = await supabase_client.get(
+            f"/rest/v1/agents?id=eq.{agent_id}&select=*",
+            headers=SUPABASE_SERVICE_HEADERS
         )
         
         if agent_response.status_code != 200 or not agent_response.json():
@@ -1288,10 +1747,9 @@ async def get_agent_conversations(agent_id: str, limit: int = 50) -> Tuple[bool,
         agent = agent_response.json()[0]
         
         # Get leads assigned to agent
-        leads_response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/leads?assigned_agent_id=eq.{agent_id}&select=*&order=last_contact_at.desc&limit={limit}",
-            headers=headers,
-            timeout=10
+        leads_response = await supabase_client.get(
+            f"/rest/v1/leads?assigned_agent_id=eq.{agent_id}&select=*&order=last_contact_at.desc&limit={limit}",
+            headers=SUPABASE_SERVICE_HEADERS
         )
         
         leads = leads_response.json() if leads_response.status_code == 200 else []
@@ -1299,10 +1757,9 @@ async def get_agent_conversations(agent_id: str, limit: int = 50) -> Tuple[bool,
         # Get recent conversations
         conversations = []
         for lead in leads[:10]:  # Top 10 recent
-            conv_response = requests.get(
-                f"{SUPABASE_URL}/rest/v1/conversations?phone=eq.{lead.get('phone')}&select=*&order=created_at.desc&limit=5",
-                headers=headers,
-                timeout=10
+            conv_response = await supabase_client.get(
+                f"/rest/v1/conversations?phone=eq.{lead.get('phone')}&select=*&order=created_at.desc&limit=5",
+                headers=SUPABASE_SERVICE_HEADERS
             )
             if conv_response.status_code == 200:
                 conv_data = conv_response.json()
@@ -1316,7 +1773,7 @@ async def get_agent_conversations(agent_id: str, limit: int = 50) -> Tuple[bool,
             "agent_id": agent_id,
             "agent_name": agent.get("name"),
             "total_conversations": agent.get("total_conversations", 0),
-            "active_conversations": len([l for l in leads if l.get("status") not in ["won", "lost"]]),
+            "active_conversations": sum(1 for l in leads if l.get("status") not in ("won", "lost")),
             "recent_conversations": conversations,
             "performance_stats": {
                 "leads_handled": agent.get("total_leads_handled", 0),